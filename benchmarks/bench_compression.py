@@ -0,0 +1,42 @@
+"""Compressed size and time of listing feeds (user-047).
+
+Runs gzip at several levels over feeds of growing size, and brotli when it is
+installed, then checks that the layer's compress_response negotiates as configured.
+
+    python benchmarks/bench_compression.py
+"""
+import gzip
+import time
+
+from fixtures import listings
+from harness import load_lambda
+
+def time_ms(function, repetitions):
+    started = time.perf_counter()
+    for _ in range(repetitions):
+        output = function()
+    return (time.perf_counter() - started) / repetitions * 1000, output
+
+def main():
+    load_lambda('getListings')
+    from giftorbid_common import compression
+    from giftorbid_common.serialization import to_json
+    for count in (1, 20, 100, 1000):
+        body = to_json(listings(count)).encode()
+        repetitions = max(5, 2000 // count)
+        codecs = [(f"gzip-{level}", lambda level=level: gzip.compress(body, compresslevel=level)) for level in (1, 6, 9)]
+        if compression.brotli:
+            codecs += [(f"br-{quality}", lambda quality=quality: compression.brotli.compress(body, quality=quality)) for quality in (4, 5, 11)]
+        for name, codec in codecs:
+            elapsed, compressed = time_ms(codec, repetitions)
+            print(f"{count:5d} listings {len(body) / 1024:9.1f} KiB  {name:7s} {len(compressed) / 1024:8.1f} KiB "
+                  f"({len(compressed) / len(body):5.1%})  {elapsed:7.2f} ms")
+
+    response = compression.compress_response(
+        {'statusCode': 200, 'body': listings(20)},
+        {'headers': {'Accept-Encoding': 'br;q=1.0, gzip;q=0.8, *;q=0.1'}}
+    )
+    print("negotiated:", response.get('headers'))
+
+if __name__ == '__main__':
+    main()
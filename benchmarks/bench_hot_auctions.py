@@ -0,0 +1,52 @@
+"""Per-bid cost and size of the hot-auctions board as bid history grows (user-050).
+
+Feeds Zipf-distributed bids over 20000 auctions, one bid per simulated second
+and 100 bids per stream batch, through GIFTorBIDindexListings' bid_activity
+and merge_hot_auctions. Landmark rebasing kicks in along the way.
+
+    python benchmarks/bench_hot_auctions.py
+"""
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from harness import load_lambda
+
+AUCTIONS = 20000
+BATCH_SIZE = 100
+KEPT_BIDS = 20
+
+def main():
+    index_listings = load_lambda('indexListings')
+    rng = random.Random(1)
+    start = datetime(2026, 10, 19)
+    bid_lists = {}
+    board = {}
+    clock = 0
+
+    for bids in (1000, 10000, 100000, 300000):
+        spent = 0
+        for _ in range(bids // BATCH_SIZE):
+            records = []
+            for _ in range(BATCH_SIZE):
+                listing_id = f"auction-{int(rng.paretovariate(1.2)) % AUCTIONS}"
+                old_bids = bid_lists.get(listing_id, [])
+                amount = (old_bids[0]['amount'] if old_bids else Decimal(10)) + rng.randint(1, 5)
+                clock += 1
+                new_bids = [{'amount': amount, 'time': (start + timedelta(seconds=clock)).isoformat() + "Z", 'bidderEmail': 'bidder'}] + old_bids[:KEPT_BIDS]
+                listing = {'listingID': listing_id, 'type': 'auction', 'status': 'available', 'name': listing_id, 'endDate': '2099-01-01T00:00:00.000000Z'}
+                records.append(({**listing, 'bids': old_bids[:KEPT_BIDS]}, {**listing, 'bids': new_bids}))
+                bid_lists[listing_id] = new_bids
+
+            started = time.perf_counter()
+            activity = [change for change in (index_listings.bid_activity(old, new) for old, new in records) if change]
+            board = index_listings.merge_hot_auctions(board, activity, start.timestamp() + clock)
+            spent += time.perf_counter() - started
+
+        print(f"after {bids:6d} more bids: {spent / bids * 1e6:5.1f} us/bid, board {len(board['entries']):3d} entries, "
+              f"{len(json.dumps(board, default=str)) / 1024:5.1f} KB")
+
+if __name__ == '__main__':
+    main()
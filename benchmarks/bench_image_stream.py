@@ -0,0 +1,88 @@
+"""Peak RSS of storing one base64 data-URL image (user-030).
+
+'before' is the old path: split the data URL, decode it whole and hash it.
+'after' is the layer's store_image, used by createListing and updateListing,
+which decodes in slices and streams them to S3 (a fake client that discards
+the bytes).
+
+Each measurement runs in a fresh subprocess and reads ru_maxrss there. The
+data URL is built first, then the peak is reset (Linux /proc/self/clear_refs)
+so it only covers the measured call. The figure is how far the peak rose
+above the RSS the process had while already holding the data URL.
+
+    python benchmarks/bench_image_stream.py
+"""
+import base64
+import gc
+import hashlib
+import os
+import resource
+import subprocess
+import sys
+
+from harness import load_lambda
+
+class FakeS3:
+    def put_object(self, **kwargs):
+        pass
+
+    def create_multipart_upload(self, **kwargs):
+        return {'UploadId': 'benchmark'}
+
+    def upload_part(self, **kwargs):
+        return {'ETag': 'benchmark'}
+
+    def complete_multipart_upload(self, **kwargs):
+        pass
+
+    def abort_multipart_upload(self, **kwargs):
+        pass
+
+def max_rss_mib():
+    # ru_maxrss is in KiB on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def reset_peak_rss():
+    """Reset the peak RSS to the current RSS; returns False where the kernel does not support it."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as clear_refs:
+            clear_refs.write('5')
+        return True
+    except OSError:
+        return False
+
+def decode_whole(image):
+    data = base64.b64decode(image.split(",")[1])
+    hashlib.sha256(data)
+
+def measure(path, size_mib):
+    """Run in the subprocess: print the peak RSS rise of one call, in MiB."""
+    load_lambda('createListing')
+    from giftorbid_common import images
+    images.s3 = FakeS3()
+    function = decode_whole if path == 'before' else lambda image: images.store_image(image, 'auctions', 'auction-benchmark')
+
+    image = "data:image/jpeg;base64," + base64.b64encode(b'\xff\xd8\xff' + os.urandom(size_mib * 2 ** 20)).decode()
+    gc.collect()
+    if not reset_peak_rss():
+        sys.exit("Resetting the peak RSS needs Linux 4.0 or newer")
+    baseline = max_rss_mib()
+    function(image)
+    print(max_rss_mib() - baseline)
+
+def main():
+    for size_mib in (5, 30, 100):
+        results = {}
+        for path in ('before', 'after'):
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), path, str(size_mib)],
+                check=True, capture_output=True, text=True
+            ).stdout
+            results[path] = float(output)
+        print(f"{size_mib:4d} MiB image: peak RSS rise before {results['before']:6.1f} MiB, after {results['after']:6.1f} MiB")
+
+if __name__ == '__main__':
+    if len(sys.argv) == 3:
+        measure(sys.argv[1], int(sys.argv[2]))
+    else:
+        main()
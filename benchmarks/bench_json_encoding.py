@@ -0,0 +1,66 @@
+"""Serialization time and memory of listing feeds (user-046).
+
+Compares the old json.dumps(default=str) with the layer's to_json, on the
+stdlib encoder and on orjson when it is installed, then compares the peak
+traced memory of gzip-compressing a large feed from one encoded string
+against compress_response streaming it.
+
+    python benchmarks/bench_json_encoding.py
+"""
+import gzip
+import json
+import statistics
+import time
+import tracemalloc
+
+from fixtures import listings
+from harness import load_lambda
+
+def median_ms(encoders, payload, repetitions):
+    """Run the encoders interleaved, so machine noise hits them alike, and keep each median."""
+    samples = {name: [] for name, _ in encoders}
+    sizes = {}
+    for _ in range(repetitions):
+        for name, encoder in encoders:
+            started = time.perf_counter()
+            sizes[name] = len(encoder(payload))
+            samples[name].append(time.perf_counter() - started)
+    return {name: (statistics.median(times) * 1000, sizes[name]) for name, times in samples.items()}
+
+def peak_mib(function):
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 2 ** 20
+
+def main():
+    load_lambda('getListings')
+    from giftorbid_common import compression, serialization
+    orjson = serialization.orjson
+
+    def to_json_stdlib(payload):
+        serialization.orjson = None
+        try:
+            return serialization.to_json(payload)
+        finally:
+            serialization.orjson = orjson
+
+    encoders = [('json default=str', lambda payload: json.dumps(payload, default=str)), ('to_json stdlib', to_json_stdlib)]
+    if orjson:
+        encoders.append(('to_json orjson', serialization.to_json))
+
+    for count in (100, 1000, 5000):
+        payload = listings(count)
+        results = median_ms(encoders, payload, max(11, 5000 // count))
+        for name, (elapsed, size) in results.items():
+            print(f"{count:5d} listings  {name:18s} {elapsed:8.2f} ms  {size / 1024:8.0f} KiB")
+
+    payload = listings(5000)
+    event = {'headers': {'Accept-Encoding': 'gzip'}}
+    whole = peak_mib(lambda: gzip.compress(serialization.to_json(payload).encode(), compresslevel=compression.GZIP_LEVEL))
+    streamed = peak_mib(lambda: compression.compress_response({'statusCode': 200, 'body': payload}, event))
+    print(f"gzip a 5000-listing feed: whole string peak {whole:6.1f} MiB, streamed peak {streamed:6.1f} MiB")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,34 @@
+"""Synthetic listings shaped like the items of the listings table."""
+import random
+from decimal import Decimal
+
+def listing(index, rng):
+    bids = [{
+        'bidderEmail': f'user{bid}@example.com',
+        'amount': Decimal(rng.randint(10, 5000)),
+        'time': '2024-05-01T10:00:00.000000Z',
+        'bidderName': f'User {bid}'
+    } for bid in range(rng.randint(0, 30))]
+    return {
+        'listingID': f'auction-{index:08d}',
+        'status': 'available',
+        'name': 'Bicicletă de oraș aproape nouă',
+        'type': 'auction',
+        'category': 'sport',
+        'description': 'Descriere ' * 40,
+        'sellerEmail': 'seller@example.com',
+        'images': [f'https://bucket.s3.amazonaws.com/variants/auctions/x/{image}/thumbnail.webp' for image in range(4)],
+        'redeemerEmail': '',
+        'listingDate': '2024-05-01T10:00:00.000000Z',
+        'sellerName': 'Seller',
+        'bids': bids,
+        'duration': Decimal(7),
+        'endDate': '2024-05-08T10:00:00.000000Z',
+        'country': 'România',
+        'county': 'Cluj',
+        'city': 'Cluj-Napoca'
+    }
+
+def listings(count, seed=1):
+    rng = random.Random(seed)
+    return [listing(index, rng) for index in range(count)]
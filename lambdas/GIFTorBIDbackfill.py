@@ -0,0 +1,402 @@
+import json
+import boto3
+from botocore.exceptions import ClientError
+import logging
+import multiprocessing
+import os
+import time
+from giftorbid_common.locations import location_key
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+dynamodb = boto3.resource('dynamodb')
+
+DYNAMODB_USER_TABLE = os.environ['DYNAMODB_USER_TABLE']
+DYNAMODB_LISTING_TABLE = os.environ['DYNAMODB_LISTING_TABLE']
+DYNAMODB_ORDERS_TABLE = os.environ['DYNAMODB_ORDERS_TABLE']
+DYNAMODB_REVIEWS_TABLE = os.environ['DYNAMODB_REVIEWS_TABLE']
+DYNAMODB_BACKFILL_TABLE = os.environ['DYNAMODB_BACKFILL_TABLE']
+# Only the image-variants job reads the image bucket.
+S3_BUCKET = os.environ.get('S3_BUCKET', '')
+
+DEFAULT_TOTAL_SEGMENTS = 8
+DEFAULT_WORKERS = 4
+DEFAULT_WRITES_PER_SECOND = 50
+SCAN_PAGE_SIZE = 100
+# Stop scanning with this much invocation time left so checkpoints are saved before the timeout.
+MIN_REMAINING_TIME_MS = 30000
+IMAGE_VARIANT_EXTENSIONS = {'thumbnail': 'webp', 'card': 'webp', 'full': 'jpg'}
+
+# Per-process S3 client for transforms that need one; created lazily in each worker.
+worker_clients = {}
+
+def lambda_handler(event, context):
+    """Run a registered backfill job over a whole table with a parallel scan.
+
+    The event names the job and optionally totalSegments, workers and either
+    capacityShare (share of the table's provisioned write capacity) or
+    maxWritesPerSecond. Progress is checkpointed per segment, so re-invoking
+    with the same event resumes until the response reports complete.
+    """
+    job_name = event.get('job')
+    if job_name not in TRANSFORMS:
+        return {'statusCode': 400, 'body': json.dumps({'error': f"Unknown backfill job: {job_name}"})}
+
+    job = TRANSFORMS[job_name]
+    job_id = event.get('jobID', job_name)
+    total_segments = int(event.get('totalSegments', DEFAULT_TOTAL_SEGMENTS))
+    workers = int(event.get('workers', DEFAULT_WORKERS))
+    writes_per_second = get_write_rate(job['table'], event)
+
+    checkpoints = load_checkpoints(job_id, total_segments)
+    pending_segments = [segment for segment in range(total_segments) if not checkpoints[segment].get('done')]
+    deadline = time.time() + (context.get_remaining_time_in_millis() - MIN_REMAINING_TIME_MS) / 1000
+
+    # The write budget is shared by the processes actually started, not the workers requested.
+    workers = min(workers, len(pending_segments))
+
+    logger.info("Backfill %s on %s: %d of %d segments pending, %d workers, %.1f writes/s",
+                job_id, job['table'], len(pending_segments), total_segments, workers, writes_per_second)
+
+    started = time.time()
+    processes = []
+    for worker in range(workers):
+        segments = pending_segments[worker::workers]
+        parent_connection, child_connection = multiprocessing.Pipe(duplex=False)
+        process = multiprocessing.Process(
+            target=run_worker,
+            args=(child_connection, job_name, job_id, segments, total_segments,
+                  {segment: checkpoints[segment] for segment in segments},
+                  writes_per_second / workers, deadline)
+        )
+        process.start()
+        # Only the child may hold the sending end, so recv() sees EOF if the worker dies without reporting.
+        child_connection.close()
+        processes.append((process, parent_connection))
+
+    stats = {'scanned': 0, 'written': 0, 'skipped': 0, 'failed': 0, 'segmentsDone': total_segments - len(pending_segments)}
+    errors = []
+    for process, connection in processes:
+        try:
+            worker_stats = connection.recv()
+        except EOFError:
+            worker_stats = {}
+        connection.close()
+        process.join()
+        if worker_stats.get('error') or process.exitcode != 0 or not worker_stats:
+            errors.append(worker_stats.get('error') or f"Worker exited with code {process.exitcode} without reporting")
+        for key in stats:
+            stats[key] += worker_stats.get(key, 0)
+
+    elapsed = time.time() - started
+    stats.update({
+        'job': job_id,
+        'complete': stats['segmentsDone'] == total_segments,
+        'elapsedSeconds': round(elapsed, 1),
+        'itemsPerSecond': round(stats['scanned'] / elapsed, 1) if elapsed else 0,
+        'failedWorkers': len(errors)
+    })
+    if errors:
+        # Checkpoints hold everything the failed workers finished; re-invoking resumes from there.
+        stats['errors'] = errors
+        logger.error("Backfill %s had %d failed workers: %s", job_id, len(errors), errors)
+    logger.info("Backfill %s progress: %s", job_id, stats)
+
+    return {'statusCode': 500 if errors else 200, 'body': json.dumps(stats)}
+
+def get_write_rate(table_name, event):
+    """Derive the write budget from a share of provisioned capacity, or an explicit rate."""
+    if 'capacityShare' in event:
+        table = dynamodb.meta.client.describe_table(TableName=table_name)['Table']
+        provisioned = table.get('ProvisionedThroughput', {}).get('WriteCapacityUnits', 0)
+        if provisioned:
+            return max(provisioned * float(event['capacityShare']), 1)
+        logger.info("Table %s is on-demand, falling back to maxWritesPerSecond", table_name)
+    return float(event.get('maxWritesPerSecond', DEFAULT_WRITES_PER_SECOND))
+
+def load_checkpoints(job_id, total_segments):
+    checkpoint_table = dynamodb.Table(DYNAMODB_BACKFILL_TABLE)
+    checkpoints = {segment: {} for segment in range(total_segments)}
+    query_kwargs = {
+        'KeyConditionExpression': 'jobID = :job',
+        'ExpressionAttributeValues': {':job': job_id}
+    }
+    while True:
+        response = checkpoint_table.query(**query_kwargs)
+        for item in response['Items']:
+            if int(item['segment']) < total_segments:
+                checkpoints[int(item['segment'])] = item
+        if 'LastEvaluatedKey' not in response:
+            return checkpoints
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def run_worker(connection, job_name, job_id, segments, total_segments, checkpoints, writes_per_second, deadline):
+    """Scan the given segments in a worker process, sending its counters back through the pipe."""
+    stats = {'scanned': 0, 'written': 0, 'skipped': 0, 'failed': 0, 'segmentsDone': 0}
+    try:
+        worker_dynamodb = boto3.resource('dynamodb')
+        job = TRANSFORMS[job_name]
+        source_table = worker_dynamodb.Table(job['table'])
+        checkpoint_table = worker_dynamodb.Table(DYNAMODB_BACKFILL_TABLE)
+        pacer = {'rate': writes_per_second, 'next': time.monotonic()}
+
+        for segment in segments:
+            checkpoint = checkpoints[segment]
+            scan_kwargs = {'Segment': segment, 'TotalSegments': total_segments, 'Limit': SCAN_PAGE_SIZE}
+            if job.get('projection'):
+                scan_kwargs['ProjectionExpression'] = job['projection']
+            if job.get('names'):
+                scan_kwargs['ExpressionAttributeNames'] = job['names']
+            if job.get('filter'):
+                scan_kwargs['FilterExpression'] = job['filter']
+            if checkpoint.get('lastEvaluatedKey'):
+                scan_kwargs['ExclusiveStartKey'] = checkpoint['lastEvaluatedKey']
+
+            done = False
+            while time.time() < deadline:
+                response = source_table.scan(**scan_kwargs)
+                writes = []
+                for item in response['Items']:
+                    writes.extend(job['transform'](item, worker_dynamodb))
+                stats['scanned'] += len(response['Items'])
+                apply_writes(worker_dynamodb, writes, pacer, stats)
+
+                last_evaluated_key = response.get('LastEvaluatedKey')
+                done = last_evaluated_key is None
+                save_checkpoint(checkpoint_table, job_id, segment, last_evaluated_key, done, len(response['Items']))
+                if done:
+                    break
+                scan_kwargs['ExclusiveStartKey'] = last_evaluated_key
+
+            if not done:
+                logger.info("Segment %d of %s stopped at the time budget", segment, job_id)
+                break
+            stats['segmentsDone'] += 1
+    except Exception as e:
+        logger.error("Backfill worker for segments %s of %s failed: %s", segments, job_id, str(e))
+        stats['error'] = f"Segments {segments}: {e}"
+    finally:
+        connection.send(stats)
+        connection.close()
+
+def apply_writes(worker_dynamodb, writes, pacer, stats):
+    """Apply one page of writes: puts through batch_writer first, then conditional updates."""
+    puts = [write['Put'] for write in writes if 'Put' in write]
+    updates = [write['Update'] for write in writes if 'Update' in write]
+
+    for table_name in dict.fromkeys(put['TableName'] for put in puts):
+        with worker_dynamodb.Table(table_name).batch_writer() as batch:
+            for put in puts:
+                if put['TableName'] == table_name:
+                    wait_for_capacity(pacer)
+                    batch.put_item(Item=put['Item'])
+                    stats['written'] += 1
+
+    for update in updates:
+        wait_for_capacity(pacer)
+        table = worker_dynamodb.Table(update.pop('TableName'))
+        try:
+            table.update_item(**update)
+            stats['written'] += 1
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                stats['skipped'] += 1
+            else:
+                logger.error("Backfill update failed for %s: %s", update['Key'], str(e))
+                stats['failed'] += 1
+
+def wait_for_capacity(pacer):
+    """Space writes evenly so the worker stays within its share of the write budget."""
+    now = time.monotonic()
+    slot = max(pacer['next'], now)
+    pacer['next'] = slot + 1 / pacer['rate']
+    if slot > now:
+        time.sleep(slot - now)
+
+def save_checkpoint(checkpoint_table, job_id, segment, last_evaluated_key, done, scanned):
+    checkpoint_table.update_item(
+        Key={'jobID': job_id, 'segment': segment},
+        UpdateExpression="SET lastEvaluatedKey = :key, done = :done, updatedAt = :now ADD scanned :scanned",
+        ExpressionAttributeValues={
+            ':key': last_evaluated_key,
+            ':done': done,
+            ':now': time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            ':scanned': scanned
+        }
+    )
+
+def user_id_sets(user, worker_dynamodb):
+    """Rewrite listingsIDs/redeemedIDs/wishlistIDs lists as string sets, or drop them when empty."""
+    list_attributes = [attribute for attribute in ['listingsIDs', 'redeemedIDs', 'wishlistIDs'] if isinstance(user.get(attribute), list)]
+    if not list_attributes:
+        return []
+
+    set_clauses = []
+    remove_clauses = []
+    conditions = []
+    expression_values = {':list_type': 'L'}
+    for attribute in list_attributes:
+        conditions.append(f"attribute_type({attribute}, :list_type)")
+        if user[attribute]:
+            set_clauses.append(f"{attribute} = :{attribute}")
+            expression_values[f":{attribute}"] = set(user[attribute])
+        else:
+            remove_clauses.append(attribute)
+
+    update_expression = ""
+    if set_clauses:
+        update_expression += "SET " + ", ".join(set_clauses)
+    if remove_clauses:
+        update_expression += " REMOVE " + ", ".join(remove_clauses)
+
+    return [{'Update': {
+        'TableName': DYNAMODB_USER_TABLE,
+        'Key': {'userEmail': user['userEmail']},
+        'UpdateExpression': update_expression.strip(),
+        'ConditionExpression': " AND ".join(conditions),
+        'ExpressionAttributeValues': expression_values
+    }}]
+
+def reviews_to_store(user, worker_dynamodb):
+    """Copy embedded reviews to the reviews table and fold them into the rating counters and histogram."""
+    if 'reviews' not in user:
+        return []
+    reviews = user['reviews']
+
+    # Legacy reviews carry no date; the "0000#" prefix sorts them before every dated reviewID.
+    writes = [{'Put': {
+        'TableName': DYNAMODB_REVIEWS_TABLE,
+        'Item': {**review, 'reviewedEmail': user['userEmail'], 'reviewID': f"0000#{index:05d}"}
+    }} for index, review in enumerate(reviews)]
+
+    histogram = {}
+    for review in reviews:
+        star = min(5, max(1, round(review['rating'])))
+        histogram[star] = histogram.get(star, 0) + 1
+
+    update_expression = "ADD ratingSum :sum, ratingCount :count"
+    expression_values = {
+        ':sum': sum(review['rating'] for review in reviews),
+        ':count': len(reviews)
+    }
+    for star, count in histogram.items():
+        update_expression += f", rating{star}Count :rating{star}"
+        expression_values[f":rating{star}"] = count
+
+    writes.append({'Update': {
+        'TableName': DYNAMODB_USER_TABLE,
+        'Key': {'userEmail': user['userEmail']},
+        'UpdateExpression': update_expression + " REMOVE reviews, averageRating",
+        'ConditionExpression': "attribute_exists(reviews)",
+        'ExpressionAttributeValues': expression_values
+    }})
+    return writes
+
+def listing_location(listing, worker_dynamodb):
+    """Copy the seller's location onto a listing created before listings carried one."""
+    if 'locationPartition' in listing:
+        return []
+    seller = worker_dynamodb.Table(DYNAMODB_USER_TABLE).get_item(
+        Key={'userEmail': listing['sellerEmail']},
+        ProjectionExpression='country, county, city'
+    ).get('Item', {})
+    if not seller.get('country'):
+        return []
+
+    county = seller.get('county') or ''
+    city = seller.get('city') or ''
+    return [{'Update': {
+        'TableName': DYNAMODB_LISTING_TABLE,
+        'Key': {'listingID': listing['listingID']},
+        'UpdateExpression': "SET country = :c, county = :co, city = :ci, locationPartition = :lp, locationSort = :ls",
+        'ConditionExpression': "attribute_exists(listingID) AND attribute_not_exists(locationPartition)",
+        'ExpressionAttributeValues': {
+            ':c': seller['country'],
+            ':co': county,
+            ':ci': city,
+            ':lp': f"{listing['type'].lower()}#{location_key(seller['country'])}",
+            ':ls': f"{location_key(county)}#{location_key(city)}#"
+        }
+    }}]
+
+def order_sweep(order, worker_dynamodb):
+    """Put orders created before the sweeper into the sweep-index, due no earlier than today."""
+    if 'sweepAt' in order or (order.get('sellerReviewed') and order.get('redeemerReviewed')):
+        return []
+    # The sweeper only looks a few days back, so long-expired orders land in today's partition.
+    today = time.strftime("%Y-%m-%d", time.gmtime())
+    return [{'Update': {
+        'TableName': DYNAMODB_ORDERS_TABLE,
+        'Key': {'orderID': order['orderID']},
+        'UpdateExpression': "SET sweepStage = :stage, sweepDay = :day, sweepAt = :at",
+        'ConditionExpression': "attribute_exists(orderID) AND attribute_not_exists(sweepAt)",
+        'ExpressionAttributeValues': {
+            ':stage': 'reviewable',
+            ':day': max(order['expirationDate'][:10], today),
+            ':at': order['expirationDate']
+        }
+    }}]
+
+def image_variants(listing, worker_dynamodb):
+    """Replace the old list of unverified variant URLs with a map of the variants that really exist."""
+    if isinstance(listing.get('imageVariants'), dict) or not listing.get('images'):
+        return []
+    if 's3' not in worker_clients:
+        worker_clients['s3'] = boto3.client('s3')
+    s3 = worker_clients['s3']
+
+    variants = {}
+    for url in listing['images']:
+        key = url.split(f"https://{S3_BUCKET}.s3.amazonaws.com/")[-1]
+        try:
+            s3.head_object(Bucket=S3_BUCKET, Key=f"variants/{key}/full.{IMAGE_VARIANT_EXTENSIONS['full']}")
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+                continue
+            raise
+        variants[url] = {
+            name: f"https://{S3_BUCKET}.s3.amazonaws.com/variants/{key}/{name}.{extension}"
+            for name, extension in IMAGE_VARIANT_EXTENSIONS.items()
+        }
+
+    return [{'Update': {
+        'TableName': DYNAMODB_LISTING_TABLE,
+        'Key': {'listingID': listing['listingID']},
+        'UpdateExpression': "SET imageVariants = :variants",
+        'ConditionExpression': "attribute_exists(listingID) AND NOT attribute_type(imageVariants, :map) AND #images = :images",
+        'ExpressionAttributeNames': {'#images': 'images'},
+        'ExpressionAttributeValues': {':variants': variants, ':map': 'M', ':images': listing['images']}
+    }}]
+
+# Registered jobs: the table to scan, an optional projection, attribute names and filter, and a transform that
+# maps each scanned item to a list of {'Put': ...} / {'Update': ...} writes.
+TRANSFORMS = {
+    'user-id-sets': {
+        'table': DYNAMODB_USER_TABLE,
+        'projection': 'userEmail, listingsIDs, redeemedIDs, wishlistIDs',
+        'transform': user_id_sets
+    },
+    'reviews-to-store': {
+        'table': DYNAMODB_USER_TABLE,
+        'projection': 'userEmail, reviews',
+        'filter': 'attribute_exists(reviews)',
+        'transform': reviews_to_store
+    },
+    'listing-location': {
+        'table': DYNAMODB_LISTING_TABLE,
+        'projection': 'listingID, sellerEmail, #type, locationPartition',
+        'names': {'#type': 'type'},
+        'transform': listing_location
+    },
+    'image-variants': {
+        'table': DYNAMODB_LISTING_TABLE,
+        'projection': 'listingID, images, imageVariants',
+        'transform': image_variants
+    },
+    'order-sweep': {
+        'table': DYNAMODB_ORDERS_TABLE,
+        'projection': 'orderID, expirationDate, sellerReviewed, redeemerReviewed, sweepAt',
+        'transform': order_sweep
+    },
+}
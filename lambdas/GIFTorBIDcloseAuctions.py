@@ -3,6 +3,7 @@ import boto3
 from datetime import datetime, timedelta
 import logging
 import os
+from giftorbid_common.notifications import enqueue_notifications
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -33,6 +34,7 @@ def lambda_handler(event, context):
     logger.info("Found %s matching listings %s:", listings_response.get('Count', 0), listings_response)
 
     expired_auctions = listings_response.get('Items', [])
+    notifications = []
 
     for listing in expired_auctions:
         listing_id = listing['listingID']
@@ -75,21 +77,16 @@ def lambda_handler(event, context):
 
             logger.info("Created notifications for seller %s and redeemer %s.", seller_email, redeemer_email)
 
-            users_table.update_item(
-                Key={'userEmail': seller_email},
-                UpdateExpression="SET notifications = list_append(if_not_exists(notifications, :empty_list), :l)",
-                ExpressionAttributeValues={":l": [seller_notification], ":empty_list": []}
-            )
-
-            logger.info("Updated notifications for seller %s.", seller_email)
-
             users_table.update_item(
                 Key={'userEmail': redeemer_email},
-                UpdateExpression="SET notifications = list_append(if_not_exists(notifications, :empty_list), :n), redeemedIDs = list_append(if_not_exists(redeemedIDs, :empty_list), :l)",
-                ExpressionAttributeValues={":n": [redeemer_notification], ":empty_list": [], ":l": [listing_id]}
+                UpdateExpression="ADD redeemedIDs :l",
+                ExpressionAttributeValues={":l": {listing_id}}
             )
 
-            logger.info("Updated notifications for redeemer %s.", redeemer_email)
+            logger.info("Updated redeemedIDs for redeemer %s.", redeemer_email)
+
+            notifications.append((seller_email, seller_notification))
+            notifications.append((redeemer_email, redeemer_notification))
 
         else:
             logger.info("No bids found for listing %s.", listing_id)
@@ -115,14 +112,10 @@ def lambda_handler(event, context):
 
             logger.info("Created notification for seller %s.", seller_email)
 
-            users_table.update_item(
-                Key={'userEmail': seller_email},
-                UpdateExpression="SET notifications = list_append(if_not_exists(notifications, :empty_list), :l)",
-                ExpressionAttributeValues={":l": [seller_notification], ":empty_list": []}
-            )
-
-            logger.info("Updated notifications for seller %s.", seller_email)
+            notifications.append((seller_email, seller_notification))
 
+    enqueue_notifications(notifications)
+    logger.info("Queued %d notifications.", len(notifications))
 
     return {
         'statusCode': 200,
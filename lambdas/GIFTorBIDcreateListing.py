@@ -1,10 +1,13 @@
 import json
 import boto3
+from botocore.exceptions import ClientError
 import uuid
-import base64
 from datetime import datetime, timedelta
 import logging
 import os
+from giftorbid_common.idempotency import handle_idempotent
+from giftorbid_common.images import verify_uploaded_images, store_images, generated_variants, record_late_variants
+from giftorbid_common.locations import location_key
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -16,9 +19,14 @@ DYNAMODB_USER_TABLE = os.environ['DYNAMODB_USER_TABLE']
 DYNAMODB_LISTING_TABLE = os.environ['DYNAMODB_LISTING_TABLE']
 S3_BUCKET = os.environ['S3_BUCKET']
 
+IDEMPOTENCY_SCOPE = 'createListing'
+
 def lambda_handler(event, context):
+    return handle_idempotent(IDEMPOTENCY_SCOPE, event, context, handle_request)
+
+def handle_request(event, context):
     try:
-        logger.info("Received event: %s", json.dumps(event))
+        logger.info("Received event: %s", json.dumps({key: value for key, value in event.items() if key != 'body'}))
 
         if 'body' not in event:
             logger.error("Missing 'body' in the event")
@@ -50,17 +58,42 @@ def lambda_handler(event, context):
 
         logger.info("Passed: validate required attributes")
 
-        listing_id = f"{body['type'].lower()}-{str(uuid.uuid4())}"
+        listing_id = body.get('listingID') or f"{body['type'].lower()}-{str(uuid.uuid4())}"
         logger.info("ListingID: %s", listing_id)
 
-        image_urls = process_images(body['images'], listing_id, body['type'])
-        logger.info("Images urls: %s", image_urls)
-
-        item = create_listing_item(body, listing_id, image_urls, user_item['name'])
+        if not valid_listing_id(listing_id, body['type'].lower()):
+            logger.error("ListingID %s is not a %s ID", listing_id, body['type'])
+            return {"statusCode": 400, "body": json.dumps({"error": "Invalid listingID"})}
 
         listing_table = dynamodb.Table(DYNAMODB_LISTING_TABLE)
-        response = listing_table.put_item(Item=item)
+        # Checked before anything is stored, so a taken ID does not leave uploaded images behind.
+        if 'Item' in listing_table.get_item(Key={'listingID': listing_id}, ProjectionExpression='listingID', ConsistentRead=True):
+            logger.error("Listing already exists: %s", listing_id)
+            return {"statusCode": 409, "body": json.dumps({"error": "Listing already exists"})}
+
+        upload_error = verify_uploaded_images(body['images'], listing_id, body['type'])
+        if upload_error:
+            logger.error(upload_error)
+            return {"statusCode": 400, "body": json.dumps({"error": upload_error})}
+
+        image_urls = store_images(body['images'], listing_id, body['type'])
+        logger.info("Images urls: %s", image_urls)
+
+        item = create_listing_item(body, listing_id, image_urls, user_item)
+
+        try:
+            response = listing_table.put_item(
+                Item=item,
+                ConditionExpression='attribute_not_exists(listingID)'
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                logger.error("Listing already exists: %s", listing_id)
+                discard_stored_images(body['images'], image_urls, listing_table, listing_id)
+                return {"statusCode": 409, "body": json.dumps({"error": "Listing already exists"})}
+            raise
         logger.info("DynamoDb resonse: %s", response)
+        record_late_variants(listing_table, listing_id, image_urls, item['imageVariants'])
 
         update_user_listings(seller_email, listing_id)
 
@@ -76,17 +109,25 @@ def lambda_handler(event, context):
         print(f"Error: {str(e)}")
         return {"statusCode": 500, "body": json.dumps({"error": str(e)})}
 
-def process_images(images, object_id, type):
-    folder = "donations" if type.lower() == "donation" else "auctions"
-    image_urls = []
-    for index, image in enumerate(images):
-        image_data = base64.b64decode(image.split(",")[1])  
-        s3_key = f"{folder}/{object_id}-{index + 1}.jpg"
-        s3.put_object(Bucket=S3_BUCKET, Key=s3_key, Body=image_data, ContentType="image/jpeg")
-        image_urls.append(f"https://{S3_BUCKET}.s3.amazonaws.com/{s3_key}")
-    return image_urls
-
-def create_listing_item(body, object_id, image_urls, user_name):
+def valid_listing_id(listing_id, listing_type):
+    """Accept only IDs shaped like the ones issued here and by createUploadSession: <type>-<uuid4>."""
+    prefix = f"{listing_type}-"
+    if not isinstance(listing_id, str) or not listing_id.startswith(prefix):
+        return False
+    try:
+        return str(uuid.UUID(listing_id[len(prefix):], version=4)) == listing_id[len(prefix):]
+    except ValueError:
+        return False
+
+def discard_stored_images(images, image_urls, listing_table, listing_id):
+    """Delete the base64 images this request stored, keeping any the listing that won the ID uses."""
+    existing = listing_table.get_item(Key={'listingID': listing_id}, ProjectionExpression='images', ConsistentRead=True)
+    in_use = set(existing.get('Item', {}).get('images', []))
+    for image, url in zip(images, image_urls):
+        if image.startswith("data:") and url not in in_use:
+            s3.delete_object(Bucket=S3_BUCKET, Key=url.split(f"https://{S3_BUCKET}.s3.amazonaws.com/")[-1])
+
+def create_listing_item(body, object_id, image_urls, user_item):
     listing_date = datetime.utcnow().isoformat() + "Z"
     item = {
         "listingID": object_id,
@@ -97,10 +138,12 @@ def create_listing_item(body, object_id, image_urls, user_name):
         "description": body['description'],
         "sellerEmail": body['sellerEmail'],
         "images": image_urls,
+        "imageVariants": generated_variants(image_urls),
         "redeemerEmail": "",
         "listingDate": listing_date,
-        "sellerName": user_name
+        "sellerName": user_item['name']
     }
+    item.update(listing_location(user_item, body['type'].lower()))
     if body['type'].lower() == "auction":
         duration = int(body.get("duration", 7))
         end_date = datetime.utcnow() + timedelta(days=duration)
@@ -115,10 +158,24 @@ def create_listing_item(body, object_id, image_urls, user_name):
         })
     return item
 
+def listing_location(user_item, listing_type):
+    """Copy the seller's location and build the location-index keys; empty when the seller has none."""
+    if not user_item.get('country'):
+        return {}
+    county = user_item.get('county') or ''
+    city = user_item.get('city') or ''
+    return {
+        "country": user_item['country'],
+        "county": county,
+        "city": city,
+        "locationPartition": f"{listing_type}#{location_key(user_item['country'])}",
+        "locationSort": f"{location_key(county)}#{location_key(city)}#"
+    }
+
 def update_user_listings(user_email, listing_id):
     user_table = dynamodb.Table(DYNAMODB_USER_TABLE)
     user_table.update_item(
         Key={'userEmail': user_email},
-        UpdateExpression='SET listingsIDs = list_append(listingsIDs, :val)',
-        ExpressionAttributeValues={':val': [listing_id]}
+        UpdateExpression='ADD listingsIDs :val',
+        ExpressionAttributeValues={':val': {listing_id}}
     )
@@ -6,6 +6,9 @@ from datetime import datetime, timedelta
 import logging
 import random
 import os
+from giftorbid_common.storage import batch_get_items
+from giftorbid_common.notifications import enqueue_notifications
+from giftorbid_common.idempotency import handle_idempotent
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -16,7 +19,12 @@ DYNAMODB_USER_TABLE = os.environ['DYNAMODB_USER_TABLE']
 DYNAMODB_ORDERS_TABLE = os.environ['DYNAMODB_ORDERS_TABLE']
 DYNAMODB_LISTING_TABLE = os.environ['DYNAMODB_LISTING_TABLE']
 
+IDEMPOTENCY_SCOPE = 'createOrder'
+
 def lambda_handler(event, context):
+    return handle_idempotent(IDEMPOTENCY_SCOPE, event, context, handle_request)
+
+def handle_request(event, context):
     try:
         if 'body' not in event:
             logger.error("Missing 'body' in the event")
@@ -34,69 +42,60 @@ def lambda_handler(event, context):
         if not sub or not redeemer_email or not seller_email or not listing_id:
             logger.error("Missing required parameters: sub, redeemerEmail, listingID, sellerEmail, listingId")
             return {"statusCode": 400, "body": json.dumps({"error": "Missing required parameters"})}
-        
-        user_table = dynamodb.Table(DYNAMODB_USER_TABLE)
-        redeemer_user_response = user_table.get_item(Key={'userEmail': redeemer_email})
 
-        if 'Item' not in redeemer_user_response:
+        if redeemer_email == seller_email:
+            logger.error(f"Self-order rejected for {redeemer_email}")
+            return {"statusCode": 403, "body": json.dumps({"error": "You cannot order your own listing"})}
+
+        items = batch_get_items({
+            DYNAMODB_USER_TABLE: {
+                'Keys': [{'userEmail': email} for email in dict.fromkeys([redeemer_email, seller_email])],
+                'ProjectionExpression': "userEmail, userID, #name, phoneNumber, country, county, city, address, postalCode",
+                'ExpressionAttributeNames': {"#name": "name"}
+            },
+            DYNAMODB_LISTING_TABLE: {
+                'Keys': [{'listingID': listing_id}],
+                'ProjectionExpression': "listingID, #name, #type, #status, bids[0]",
+                'ExpressionAttributeNames': {"#name": "name", "#type": "type", "#status": "status"}
+            }
+        })
+        users = {user['userEmail']: user for user in items[DYNAMODB_USER_TABLE]}
+
+        if redeemer_email not in users:
             logger.error(f"User not found: {redeemer_email}")
             return {"statusCode": 404, "body": json.dumps({"error": "User not found"})}
 
-        redeemer_user_item = redeemer_user_response['Item']
-        if redeemer_user_item['userID'] != sub or listing_id not in redeemer_user_item.get('redeemedIDs', []):
+        redeemer_user_item = users[redeemer_email]
+        if redeemer_user_item['userID'] != sub:
             logger.error("Unauthorized access or listing not found")
             return {"statusCode": 403, "body": json.dumps({"error": "Unauthorized access or listing not found"})}
 
         logger.info(f"Pass user retrieve for redeemer")
 
-        seller_user_response = user_table.get_item(Key={'userEmail': seller_email})
-
-        if 'Item' not in seller_user_response:
+        if seller_email not in users:
             logger.error(f"User not found: {seller_email}")
             return {"statusCode": 404, "body": json.dumps({"error": "User not found"})}
 
-        seller_user_item = seller_user_response['Item']
-        if listing_id not in seller_user_item.get('listingsIDs', []):
-            logger.error("Listing not found in sellers listings")
-            return {"statusCode": 403, "body": json.dumps({"error": "Listing not found in sellers listing"})}
+        seller_user_item = users[seller_email]
 
         logger.info(f"Pass user retrieve for seller")
 
-        listing_table = dynamodb.Table(DYNAMODB_LISTING_TABLE)
-        listing_response = listing_table.get_item(Key={'listingID': listing_id})
-
-        if 'Item' not in listing_response:
+        if not items[DYNAMODB_LISTING_TABLE]:
             return {"statusCode": 404, "body": json.dumps({"error": "Listing not found"})}
     
-        listing_item = listing_response['Item']
+        listing_item = items[DYNAMODB_LISTING_TABLE][0]
 
         logger.info(f"Pass listing retrieve for table")
 
-        if listing_item['status'] == 'orderd' or listing_item['status'] == 'complete':
+        if listing_item['status'] in ['ordered', 'complete']:
             return {"statusCode": 404, "body": json.dumps({"error": "Listing was already ordered"})}
 
-        listing_end_date = listing_item['endDate']
-        now = datetime.utcnow().isoformat() + "Z"
-        logger.info(f"Current time: {now}, {type(now)}")
-
-        listing_end_date_dt = datetime.strptime(listing_end_date, "%Y-%m-%dT%H:%M:%S.%fZ")
-        now_dt = datetime.strptime(now, "%Y-%m-%dT%H:%M:%S.%fZ")
-
         number_part = ''.join([str(random.randint(0, 9)) for _ in range(11)])
         generated_awb = f"GOB{number_part}"
 
         logger.info("generated awb %s", generated_awb)
         
         order_id = f"order-{listing_id}"
-        orders_table = dynamodb.Table(DYNAMODB_ORDERS_TABLE)
-        existing_order = orders_table.get_item(Key={'orderID': order_id})
-
-        if 'Item' in existing_order:
-            logger.error(f"Order already exists for listingID: {listing_id}")
-            return {
-                "statusCode": 400,
-                "body": json.dumps({"error": "Order already exists for this listing"})
-            }
 
         pickup_point = f"country: {seller_user_item['country']}, county: {seller_user_item['county']}, city: {seller_user_item['city']}, adress: {seller_user_item['address']} {seller_user_item['postalCode']}"
         drop_point = f"country: {redeemer_user_item['country']}, county: {redeemer_user_item['county']}, city: {redeemer_user_item['city']}, adress: {redeemer_user_item['address']} {redeemer_user_item['postalCode']}"
@@ -110,36 +109,26 @@ def lambda_handler(event, context):
             bids = listing_item.get('bids', [])
             cost += bids[0]['amount']
 
-        resource = orders_table.put_item(
-            Item={
-                'orderID': order_id,
-                'awb': generated_awb,
-                'listingID': listing_id,
-                'sellerEmail': seller_email,
-                'sellerPhone': seller_user_item['phoneNumber'],
-                'redeemerEmail': redeemer_email,
-                'redeemerPhone': redeemer_user_item['phoneNumber'],
-                'pickupPoint': pickup_point,
-                'dropPoint': drop_point,
-                'orderDate': order_date,
-                'expirationDate': expiration_date,
-                'redeemerReviewed': bool(False),
-                'sellerReviewed': bool(False),
-                'cost': cost
-            }
-        )
-
-        update_listing_status = listing_table.update_item(
-            Key={'listingID': listing_id},
-            UpdateExpression="SET #status = :s",
-            ExpressionAttributeNames={
-                "#status": "status"
-            },
-            ExpressionAttributeValues={":s": "ordered"},
-            ReturnValues="UPDATED_NEW"
-        )
-
-        logger.info("Listing updated successfully: %s", update_listing_status)
+        order = {
+            'orderID': order_id,
+            'awb': generated_awb,
+            'listingID': listing_id,
+            'sellerEmail': seller_email,
+            'sellerPhone': seller_user_item['phoneNumber'],
+            'redeemerEmail': redeemer_email,
+            'redeemerPhone': redeemer_user_item['phoneNumber'],
+            'pickupPoint': pickup_point,
+            'dropPoint': drop_point,
+            'orderDate': order_date,
+            'expirationDate': expiration_date,
+            'redeemerReviewed': bool(False),
+            'sellerReviewed': bool(False),
+            'cost': cost,
+            # Sparse sweep-index keys: GIFTorBIDsweepOrders picks the order up once it expires.
+            'sweepStage': 'reviewable',
+            'sweepDay': expiration_date[:10],
+            'sweepAt': expiration_date
+        }
 
         notification_message = f"User {redeemer_user_item['name']} ordered item {listing_item['name']}."
         notification = { 
@@ -147,12 +136,58 @@ def lambda_handler(event, context):
             'redirect': '/posts'
         }
 
-        update_sellerUser = user_table.update_item(
-                Key={'userEmail': seller_email},
-                UpdateExpression="SET notifications = list_append(if_not_exists(notifications, :empty_list), :l)",
-                ExpressionAttributeValues={":l": [notification],  ":empty_list": []},
-                ReturnValues="UPDATED_NEW"
-        )
+        try:
+            dynamodb.meta.client.transact_write_items(TransactItems=[
+                {
+                    'Put': {
+                        'TableName': DYNAMODB_ORDERS_TABLE,
+                        'Item': order,
+                        'ConditionExpression': "attribute_not_exists(orderID)"
+                    }
+                },
+                {
+                    'Update': {
+                        'TableName': DYNAMODB_LISTING_TABLE,
+                        'Key': {'listingID': listing_id},
+                        'UpdateExpression': "SET #status = :s",
+                        'ConditionExpression': "attribute_exists(listingID) AND NOT #status IN (:s, :complete)",
+                        'ExpressionAttributeNames': {"#status": "status"},
+                        'ExpressionAttributeValues': {":s": "ordered", ":complete": "complete"}
+                    }
+                },
+                {
+                    'ConditionCheck': {
+                        'TableName': DYNAMODB_USER_TABLE,
+                        'Key': {'userEmail': seller_email},
+                        'ConditionExpression': "contains(listingsIDs, :listing_id)",
+                        'ExpressionAttributeValues': {":listing_id": listing_id}
+                    }
+                },
+                {
+                    'ConditionCheck': {
+                        'TableName': DYNAMODB_USER_TABLE,
+                        'Key': {'userEmail': redeemer_email},
+                        'ConditionExpression': "contains(redeemedIDs, :listing_id)",
+                        'ExpressionAttributeValues': {":listing_id": listing_id}
+                    }
+                }
+            ])
+        except dynamodb.meta.client.exceptions.TransactionCanceledException as e:
+            reasons = [reason.get('Code') for reason in e.response.get('CancellationReasons', [])]
+            logger.error(f"Order transaction cancelled: {reasons}")
+            if len(reasons) > 3 and reasons[3] == 'ConditionalCheckFailed':
+                return {"statusCode": 403, "body": json.dumps({"error": "Unauthorized access or listing not found"})}
+            if len(reasons) > 2 and reasons[2] == 'ConditionalCheckFailed':
+                return {"statusCode": 403, "body": json.dumps({"error": "Listing not found in sellers listing"})}
+            if len(reasons) > 1 and reasons[1] == 'ConditionalCheckFailed':
+                return {"statusCode": 404, "body": json.dumps({"error": "Listing was already ordered"})}
+            if reasons and reasons[0] == 'ConditionalCheckFailed':
+                return {"statusCode": 400, "body": json.dumps({"error": "Order already exists for this listing"})}
+            raise
+
+        logger.info("Order %s created and listing marked as ordered", order_id)
+
+        enqueue_notifications([(seller_email, notification)])
 
         return {
             "statusCode": 200,
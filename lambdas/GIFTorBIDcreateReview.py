@@ -6,6 +6,8 @@ from datetime import datetime, timedelta, timezone
 import logging
 import random
 import os
+from giftorbid_common.storage import batch_get_items
+from giftorbid_common.notifications import enqueue_notifications
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -15,6 +17,7 @@ dynamodb = boto3.resource('dynamodb')
 DYNAMODB_USER_TABLE = os.environ['DYNAMODB_USER_TABLE']
 DYNAMODB_ORDERS_TABLE = os.environ['DYNAMODB_ORDERS_TABLE']
 DYNAMODB_LISTING_TABLE = os.environ['DYNAMODB_LISTING_TABLE']
+DYNAMODB_REVIEWS_TABLE = os.environ['DYNAMODB_REVIEWS_TABLE']
 
 def lambda_handler(event, context):
     try:
@@ -36,32 +39,39 @@ def lambda_handler(event, context):
             logger.error("Missing required parameters: sub, userEmail, listingID, message, rating")
             return {"statusCode": 400, "body": json.dumps({"error": "Missing required parameters, listingID, message, rating"})}
 
+        if not isinstance(rating, int) or isinstance(rating, bool) or not 1 <= rating <= 5:
+            logger.error(f"Invalid rating: {rating}")
+            return {"statusCode": 400, "body": json.dumps({"error": "Rating must be a whole number between 1 and 5"})}
+
         users_table = dynamodb.Table(DYNAMODB_USER_TABLE)
         orders_table = dynamodb.Table(DYNAMODB_ORDERS_TABLE)
         listings_table = dynamodb.Table(DYNAMODB_LISTING_TABLE)
 
-        writer_response = users_table.get_item(Key={'userEmail': writer_email})
-        if 'Item' not in writer_response:
+        order_id = f"order-{listing_id}"
+        items = batch_get_items({
+            DYNAMODB_USER_TABLE: {'Keys': [{'userEmail': writer_email}]},
+            DYNAMODB_ORDERS_TABLE: {'Keys': [{'orderID': order_id}]},
+            DYNAMODB_LISTING_TABLE: {'Keys': [{'listingID': listing_id}]}
+        })
+
+        if not items[DYNAMODB_USER_TABLE]:
             logger.error(f"User not found: {writer_email}")
             return {"statusCode": 404, "body": json.dumps({"error": "User not found"})}
-        writer_item = writer_response['Item']
+        writer_item = items[DYNAMODB_USER_TABLE][0]
 
         if writer_item['userID'] != sub:
             logger.error("User info not matching anyone in user pool")
             return {"statusCode": 403, "body": json.dumps({"error": "User info not matching anyone in user pool"})}
         
-        order_id = f"order-{listing_id}"
-        order_response = orders_table.get_item(Key={'orderID': order_id})
-        order_exists = 'Item' in order_response
+        order_exists = bool(items[DYNAMODB_ORDERS_TABLE])
 
-        listing_response = listings_table.get_item(Key={'listingID': listing_id})
-        if 'Item' not in listing_response:
+        if not items[DYNAMODB_LISTING_TABLE]:
             logger.error(f"Listing not found: {listing_id}")
             return {"statusCode": 404, "body": json.dumps({"error": "Listing not found"})}
-        listing_item = listing_response['Item']
+        listing_item = items[DYNAMODB_LISTING_TABLE][0]
 
         if order_exists:
-            order_item = order_response['Item']
+            order_item = items[DYNAMODB_ORDERS_TABLE][0]
             is_seller = order_item['sellerEmail'] == writer_email
             is_redeemer = order_item['redeemerEmail'] == writer_email
 
@@ -114,18 +124,24 @@ def lambda_handler(event, context):
                 logger.error("No redeemer found to review")
                 return {"statusCode": 400, "body": json.dumps({"error": "No redeemer to review"})}
 
-        reviewed_response = users_table.get_item(Key={'userEmail': reviewed_email})
+        reviewed_response = users_table.get_item(Key={'userEmail': reviewed_email}, ProjectionExpression='userEmail')
         if 'Item' not in reviewed_response:
             logger.error("Reviewed user not found")
             return {"statusCode": 404, "body": json.dumps({"error": "Reviewed user not found"})}
-        reviewed_item = reviewed_response['Item']
 
+        review_date = datetime.utcnow().isoformat() + "Z"
+        # One review per writer and order (or ended listing cycle): a retry gets the same reviewID and
+        # fails the attribute_not_exists condition. The date prefix keeps getReviews newest first.
+        cycle_date = order_item['orderDate'] if order_exists else listing_item['endDate']
         review = {
+            'reviewedEmail': reviewed_email,
+            'reviewID': f"{cycle_date}#{listing_id}#{writer_email}",
+            'listingID': listing_id,
             'message': message,
             'rating': rating,
             'writerEmail': writer_email,
-            'writerName': writer_item['name']
-            
+            'writerName': writer_item['name'],
+            'reviewDate': review_date
         }
 
         notification_message = f"User {writer_item['name']} reviewed you."
@@ -135,67 +151,62 @@ def lambda_handler(event, context):
             'redirect': '/account'
         }
 
-        reviews = reviewed_item['reviews']
-        logger.info(f"Reviews: {reviews}")
-        ratings = [review['rating'] for review in reviews]
-        logger.info(f"Ratings: {ratings}")
-        average_rating = (sum(ratings) + rating) / (len(ratings) + 1) if ratings else rating
-        average_rating = round(average_rating, 1)
-        logger.info(f"Average rating: {average_rating}")
-
-        users_table.update_item(
-            Key={'userEmail': reviewed_email},
-            UpdateExpression="SET reviews = list_append(if_not_exists(reviews, :empty_list), :r), notifications = list_append(if_not_exists(notifications, :empty_list), :l), averageRating = :a",
-            ExpressionAttributeValues={":l": [notification], ":empty_list": [], ":r": [review], ":a": average_rating},
-            ReturnValues="UPDATED_NEW"
-        )
+        transact_items = [
+            {
+                'Put': {
+                    'TableName': DYNAMODB_REVIEWS_TABLE,
+                    'Item': review,
+                    'ConditionExpression': 'attribute_not_exists(reviewID)'
+                }
+            },
+            {
+                'Update': {
+                    'TableName': DYNAMODB_USER_TABLE,
+                    'Key': {'userEmail': reviewed_email},
+                    'UpdateExpression': f"ADD ratingSum :r, ratingCount :one, rating{rating}Count :one",
+                    'ExpressionAttributeValues': {":r": rating, ":one": 1}
+                }
+            }
+        ]
 
         if order_exists:
-            if is_redeemer:
-                update_order = orders_table.update_item(
-                    Key={'orderID': order_id},
-                    UpdateExpression="SET sellerReviewed = :val",
-                    ExpressionAttributeValues={":val": True},
-                    ReturnValues="UPDATED_NEW"
-                )
-                if order_item['redeemerReviewed'] == True:
-                    listings_table.update_item(
-                        Key={'listingID': order_item['listingID']},
-                        UpdateExpression="SET #status = :s",
-                        ExpressionAttributeNames={
-                            "#status": "status"
-                        },
-                        ExpressionAttributeValues={":s": "complete"},
-                        ReturnValues="UPDATED_NEW"
-                    )
-                    
-
-            elif is_seller:
-                update_order = orders_table.update_item(
-                    Key={'orderID': order_id},
-                    UpdateExpression="SET redeemerReviewed = :val",
-                    ExpressionAttributeValues={":val": True},
+            reviewed_flag = 'sellerReviewed' if is_redeemer else 'redeemerReviewed'
+            transact_items.append({
+                'Update': {
+                    'TableName': DYNAMODB_ORDERS_TABLE,
+                    'Key': {'orderID': order_id},
+                    'UpdateExpression': f"SET {reviewed_flag} = :val",
+                    'ConditionExpression': f"{reviewed_flag} = :false",
+                    'ExpressionAttributeValues': {":val": True, ":false": False}
+                }
+            })
+
+        try:
+            dynamodb.meta.client.transact_write_items(TransactItems=transact_items)
+        except dynamodb.meta.client.exceptions.TransactionCanceledException as e:
+            logger.error(f"Review transaction cancelled: {e.response.get('CancellationReasons')}")
+            return {"statusCode": 400, "body": json.dumps({"error": "Review already sent"})}
+
+        logger.info(f"Stored review {review['reviewID']} for {reviewed_email}")
+
+        enqueue_notifications([(reviewed_email, notification)])
+
+        if order_exists:
+            other_party_reviewed = order_item['redeemerReviewed'] if is_redeemer else order_item['sellerReviewed']
+            if other_party_reviewed == True:
+                listings_table.update_item(
+                    Key={'listingID': order_item['listingID']},
+                    UpdateExpression="SET #status = :s",
+                    ExpressionAttributeNames={
+                        "#status": "status"
+                    },
+                    ExpressionAttributeValues={":s": "complete"},
                     ReturnValues="UPDATED_NEW"
                 )
-                if order_item['sellerReviewed'] == True:
-                    listings_table.update_item(
-                        Key={'listingID': order_item['listingID']},
-                        UpdateExpression="SET #status = :s",
-                        ExpressionAttributeNames={
-                            "#status": "status"
-                        },
-                        ExpressionAttributeValues={":s": "complete"},
-                        ReturnValues="UPDATED_NEW"
-                    )
-
-            else:
-                logger.error("Unauthorized access")
         
         else:
 
-            redeemer_user_response = users_table.get_item(Key={'userEmail': listing_item['redeemerEmail']})
-            redeemer_user_item = redeemer_user_response['Item']
-            redeemer_email = listing_item['redeemerEmail']
+            redeemer_email = reviewed_email
 
             update_expression = "SET #status = :status, redeemerEmail = :empty"
             expression_values = {":status": "available", ":empty": "", ":now": now}
@@ -216,13 +227,11 @@ def lambda_handler(event, context):
                 ExpressionAttributeNames=expression_names
             )
 
-            if listing_id in redeemer_user_item.get('redeemedIDs', []):
-                redeemer_user_item['redeemedIDs'].remove(listing_id)
-                users_table.update_item(
-                    Key={'userEmail': redeemer_email},
-                    UpdateExpression="SET redeemedIDs = :r",
-                    ExpressionAttributeValues={":r": redeemer_user_item['redeemedIDs']}
-                )
+            users_table.update_item(
+                Key={'userEmail': redeemer_email},
+                UpdateExpression="DELETE redeemedIDs :r",
+                ExpressionAttributeValues={":r": {listing_id}}
+            )
         
         return {
             "statusCode": 200,
@@ -240,4 +249,3 @@ def lambda_handler(event, context):
                 "error": str(e)
             })
         }
-
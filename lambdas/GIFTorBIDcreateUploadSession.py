@@ -0,0 +1,112 @@
+import json
+import boto3
+from botocore.exceptions import ClientError
+import base64
+import uuid
+import logging
+import os
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+dynamodb = boto3.resource('dynamodb')
+s3 = boto3.client('s3')
+
+DYNAMODB_USER_TABLE = os.environ['DYNAMODB_USER_TABLE']
+S3_BUCKET = os.environ['S3_BUCKET']
+
+MAX_IMAGES = 10
+MAX_IMAGE_SIZE = 10 * 1024 * 1024
+UPLOAD_URL_EXPIRATION = 900
+ALLOWED_CONTENT_TYPES = ['image/jpeg', 'image/png', 'image/webp']
+CONTENT_TYPE_EXTENSIONS = {'image/jpeg': 'jpg', 'image/png': 'png', 'image/webp': 'webp'}
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+def lambda_handler(event, context):
+    try:
+        logger.info("Received event: %s", json.dumps(event))
+
+        if 'body' not in event:
+            logger.error("Missing 'body' in the event")
+            return {"statusCode": 400, "body": json.dumps({"error": "Missing 'body' in the event"})}
+
+        body = json.loads(event['body'])
+        sub = body.get('sub')
+        seller_email = body.get('sellerEmail')
+        listing_type = body.get('type')
+        listing_id = body.get('listingID')
+        images = body.get('images')
+
+        if not sub or not seller_email or not listing_type or not images:
+            logger.error("Missing required parameters: sub, sellerEmail, type or images")
+            return {"statusCode": 400, "body": json.dumps({"error": "Missing required parameters"})}
+
+        if len(images) > MAX_IMAGES:
+            return {"statusCode": 400, "body": json.dumps({"error": f"At most {MAX_IMAGES} images can be uploaded"})}
+
+        for image in images:
+            if image.get('contentType') not in ALLOWED_CONTENT_TYPES:
+                return {"statusCode": 400, "body": json.dumps({"error": f"Unsupported content type: {image.get('contentType')}"})}
+            if not decode_checksum(image.get('checksumSHA256')):
+                return {"statusCode": 400, "body": json.dumps({"error": "Each image needs a base64 SHA-256 checksumSHA256"})}
+
+        user_table = dynamodb.Table(DYNAMODB_USER_TABLE)
+        user_response = user_table.get_item(Key={'userEmail': seller_email})
+        if 'Item' not in user_response or user_response['Item']['userID'] != sub:
+            logger.error("Unauthorized or no such user")
+            return {"statusCode": 403, "body": json.dumps({"error": "Unauthorized or no such user"})}
+
+        if listing_id:
+            if listing_id not in user_response['Item'].get('listingsIDs', []):
+                logger.error("Listing %s does not belong to %s", listing_id, seller_email)
+                return {"statusCode": 403, "body": json.dumps({"error": "Unauthorized access or listing not found"})}
+        else:
+            listing_id = f"{listing_type.lower()}-{str(uuid.uuid4())}"
+
+        folder = "donations" if listing_type.lower() == "donation" else "auctions"
+        uploads = [create_upload(folder, listing_id, image) for image in images]
+        logger.info("Created %d upload urls for listing %s", len(uploads), listing_id)
+
+        return {
+            "statusCode": 200,
+            "body": json.dumps({
+                "listingID": listing_id,
+                "uploads": uploads
+            })
+        }
+
+    except Exception as e:
+        logger.error("Error: %s", str(e))
+        return {"statusCode": 500, "body": json.dumps({"error": str(e)})}
+
+def decode_checksum(checksum):
+    """Return the hex digest of a base64 SHA-256 checksum, or None if it is malformed."""
+    try:
+        digest = base64.b64decode(checksum or "", validate=True)
+    except ValueError:
+        return None
+    return digest.hex() if len(digest) == 32 else None
+
+def create_upload(folder, listing_id, image):
+    """Create a presigned POST for a content-addressed key, unless the image is already stored."""
+    s3_key = f"{folder}/{listing_id}/{decode_checksum(image['checksumSHA256'])}.{CONTENT_TYPE_EXTENSIONS[image['contentType']]}"
+    try:
+        s3.head_object(Bucket=S3_BUCKET, Key=s3_key)
+        logger.info("Image already stored, no upload needed: %s", s3_key)
+        return {"key": s3_key, "exists": True}
+    except ClientError as e:
+        if e.response['Error']['Code'] not in ['404', 'NoSuchKey', 'NotFound']:
+            raise
+
+    post = s3.generate_presigned_post(
+        Bucket=S3_BUCKET,
+        Key=s3_key,
+        Fields={"Content-Type": image['contentType'], "Cache-Control": IMMUTABLE_CACHE_CONTROL},
+        Conditions=[
+            {"Content-Type": image['contentType']},
+            {"Cache-Control": IMMUTABLE_CACHE_CONTROL},
+            ["content-length-range", 1, MAX_IMAGE_SIZE]
+        ],
+        ExpiresIn=UPLOAD_URL_EXPIRATION
+    )
+    return {"key": s3_key, "exists": False, "url": post['url'], "fields": post['fields']}
@@ -27,11 +27,8 @@ def lambda_handler(event, context):
         'city': '',
         'address': '',
         'postalCode': '',
-        'averageRating': 0,
-        'listingsIDs': [],
-        'redeemedIDs': [],
-        'wishlistIDs': [],
-        'reviews': [],
+        'ratingSum': 0,
+        'ratingCount': 0,
         'notifications': [],
     }
 
@@ -13,6 +13,9 @@ DYNAMODB_USER_TABLE = os.environ['DYNAMODB_USER_TABLE']
 DYNAMODB_LISTING_TABLE = os.environ['DYNAMODB_LISTING_TABLE']
 S3_BUCKET = os.environ['S3_BUCKET']
 
+DELETE_BATCH_SIZE = 1000
+IMAGE_VARIANT_EXTENSIONS = {'thumbnail': 'webp', 'card': 'webp', 'full': 'jpg'}
+
 def lambda_handler(event, context):
     try:
         logger.info("Received event: %s", json.dumps(event))
@@ -73,37 +76,35 @@ def lambda_handler(event, context):
         return {"statusCode": 500, "body": json.dumps({"error": str(e)})}
 
 def delete_images(image_urls):
-    """Delete images from S3 based on their URLs."""
+    """Delete images from S3 in batches, returning the keys that could not be deleted."""
+    failed_keys = []
     try:
+        keys = []
         for url in image_urls:
             key = url.split(f"https://{S3_BUCKET}.s3.amazonaws.com/")[-1]
-            s3.delete_object(Bucket=S3_BUCKET, Key=key)
-            logger.info(f"Deleted image from S3: {key}")
+            keys.append(key)
+            keys.extend(f"variants/{key}/{name}.{extension}" for name, extension in IMAGE_VARIANT_EXTENSIONS.items())
+        for start in range(0, len(keys), DELETE_BATCH_SIZE):
+            batch = keys[start:start + DELETE_BATCH_SIZE]
+            response = s3.delete_objects(
+                Bucket=S3_BUCKET,
+                Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+            )
+            for error in response.get('Errors', []):
+                logger.error(f"Failed to delete image from S3: {error['Key']}: {error['Code']} {error['Message']}")
+                failed_keys.append(error['Key'])
+            logger.info(f"Deleted {len(batch) - len(response.get('Errors', []))} of {len(batch)} images from S3")
     except Exception as e:
         logger.error(f"Error deleting images from S3: {str(e)}")
+    return failed_keys
 
 def update_user_listings(seller_email, listing_id, user_table):
-    """Remove the listingID from the user's listingsIDs array in DynamoDB."""
+    """Remove the listingID from the user's listingsIDs set in DynamoDB."""
     try:
-        response = user_table.get_item(Key={'userEmail': seller_email})
-
-        if 'Item' not in response:
-            logger.error(f"User not found in database: {seller_email}")
-            return
-
-        user_item = response['Item']
-        listing_ids = user_item.get('listingsIDs', [])
-
-        if listing_id not in listing_ids:
-            logger.warning(f"Listing ID {listing_id} not found in user's listings")
-            return
-
-        listing_ids.remove(listing_id)
-
         user_table.update_item(
             Key={'userEmail': seller_email},
-            UpdateExpression="SET listingsIDs = :updated_list",
-            ExpressionAttributeValues={":updated_list": listing_ids}
+            UpdateExpression="DELETE listingsIDs :listing_id",
+            ExpressionAttributeValues={":listing_id": {listing_id}}
         )
 
         logger.info(f"Successfully removed {listing_id} from user's listingsIDs: {seller_email}")
@@ -0,0 +1,450 @@
+import json
+import boto3
+import gzip
+import hashlib
+import io
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+s3 = boto3.client('s3')
+
+DYNAMODB_USER_TABLE = os.environ['DYNAMODB_USER_TABLE']
+DYNAMODB_LISTING_TABLE = os.environ['DYNAMODB_LISTING_TABLE']
+DYNAMODB_ORDERS_TABLE = os.environ['DYNAMODB_ORDERS_TABLE']
+DYNAMODB_REVIEWS_TABLE = os.environ['DYNAMODB_REVIEWS_TABLE']
+EXPORT_DESTINATION = os.environ.get('EXPORT_DESTINATION', '/tmp/snapshots')
+
+DEFAULT_TOTAL_SEGMENTS = 4
+# Read capacity units per second the scan may use per table, shared by its segments.
+DEFAULT_READ_UNITS_PER_SECOND = 100
+SCAN_PAGE_SIZE = 500
+ROWS_PER_FILE = 100000
+MANIFEST_FILE = '_manifest.json'
+DELETES_FILE = '_deletes.json'
+# Row fingerprints live in hash shards next to the runs; a run rewrites only the shards it changed.
+FINGERPRINTS_DIR = '_fingerprints'
+FINGERPRINT_SHARDS = 64
+# 64 bits of the SHA-1 are plenty to notice that a row changed.
+FINGERPRINT_LENGTH = 16
+
+def listing_partition(listing):
+    return f"type={listing.get('type', 'unknown')}"
+
+def month_partition(attribute):
+    return lambda item: f"month={(item.get(attribute) or 'unknown')[:7]}"
+
+def listing_row(listing):
+    bids = listing.get('bids') or []
+    return {
+        'listingID': listing['listingID'],
+        'type': listing.get('type'),
+        'status': listing.get('status'),
+        'category': listing.get('category'),
+        'name': listing.get('name'),
+        'sellerEmail': listing.get('sellerEmail'),
+        'redeemerEmail': listing.get('redeemerEmail') or None,
+        'listingDate': listing.get('listingDate'),
+        'endDate': listing.get('endDate') or None,
+        'duration': listing.get('duration'),
+        'country': listing.get('country'),
+        'county': listing.get('county'),
+        'city': listing.get('city'),
+        'bidCount': len(bids),
+        'highestBid': bids[0]['amount'] if bids else None,
+        'imageCount': len(listing.get('images') or [])
+    }
+
+def listing_bid_rows(listing):
+    return [{
+        'listingID': listing['listingID'],
+        'type': listing.get('type'),
+        'bidIndex': index,
+        'bidderEmail': bid.get('bidderEmail'),
+        'amount': bid.get('amount'),
+        'time': bid.get('time')
+    } for index, bid in enumerate(reversed(listing.get('bids') or []))]
+
+def order_row(order):
+    return {
+        'orderID': order['orderID'],
+        'listingID': order.get('listingID'),
+        'sellerEmail': order.get('sellerEmail'),
+        'redeemerEmail': order.get('redeemerEmail'),
+        'orderDate': order.get('orderDate'),
+        'expirationDate': order.get('expirationDate'),
+        'cost': order.get('cost'),
+        'awb': order.get('awb'),
+        'sellerReviewed': order.get('sellerReviewed'),
+        'redeemerReviewed': order.get('redeemerReviewed')
+    }
+
+def user_row(user):
+    # Contact details (phone, address, notifications) stay out of analytics snapshots.
+    row = {
+        'userEmail': user['userEmail'],
+        'name': user.get('name'),
+        'country': user.get('country'),
+        'county': user.get('county'),
+        'city': user.get('city'),
+        'ratingSum': user.get('ratingSum'),
+        'ratingCount': user.get('ratingCount'),
+        'listingCount': len(user.get('listingsIDs') or []),
+        'redeemedCount': len(user.get('redeemedIDs') or [])
+    }
+    for star in range(1, 6):
+        row[f"rating{star}Count"] = user.get(f"rating{star}Count", 0)
+    return row
+
+def review_row(review):
+    return {
+        'reviewedEmail': review['reviewedEmail'],
+        'reviewID': review['reviewID'],
+        'listingID': review.get('listingID'),
+        'writerEmail': review.get('writerEmail'),
+        'rating': review.get('rating'),
+        'reviewDate': review.get('reviewDate')
+    }
+
+# Each export scans one table into one parent dataset; children flatten nested
+# lists into their own datasets keyed by the parent key.
+EXPORTS = {
+    'listings': {
+        'table': DYNAMODB_LISTING_TABLE,
+        'key': ['listingID'],
+        'partition': listing_partition,
+        'row': listing_row,
+        'children': {'listing_bids': listing_bid_rows}
+    },
+    'orders': {
+        'table': DYNAMODB_ORDERS_TABLE,
+        'key': ['orderID'],
+        'partition': month_partition('orderDate'),
+        'row': order_row,
+        'children': {}
+    },
+    'users': {
+        'table': DYNAMODB_USER_TABLE,
+        'key': ['userEmail'],
+        'partition': lambda user: 'all',
+        'row': user_row,
+        'children': {}
+    },
+    'reviews': {
+        'table': DYNAMODB_REVIEWS_TABLE,
+        'key': ['reviewedEmail', 'reviewID'],
+        'partition': month_partition('reviewDate'),
+        'row': review_row,
+        'children': {}
+    },
+}
+
+# Child datasets are keyed by their parent's key so a changed parent replaces all its rows.
+CHILD_KEYS = {child: spec['key'] for spec in EXPORTS.values() for child in spec['children']}
+
+def lambda_handler(event, context):
+    """Export the marketplace tables as partitioned Parquet (or gzip JSONL) snapshots.
+
+    Every run scans the tables with a parallel scan, paced to maxReadUnitsPerSecond,
+    but writes only rows whose content changed since the previous run, plus a
+    deletes list, under a new run=<id> prefix. read_snapshot merges the runs
+    back into the latest state.
+    """
+    destination = event.get('destination', EXPORT_DESTINATION).rstrip('/')
+    exports = event.get('exports', list(EXPORTS))
+    total_segments = int(event.get('totalSegments', DEFAULT_TOTAL_SEGMENTS))
+    read_units_per_second = float(event.get('maxReadUnitsPerSecond', DEFAULT_READ_UNITS_PER_SECOND))
+    full = bool(event.get('full', False))
+
+    unknown = [name for name in exports if name not in EXPORTS]
+    if unknown:
+        return {'statusCode': 400, 'body': json.dumps({'error': f"Unknown exports: {unknown}"})}
+
+    manifest = read_manifest(destination)
+    if full:
+        manifest = {'runs': [], 'format': file_format(), 'fingerprintShards': {}}
+    elif manifest.get('runs') and manifest.get('format') != file_format():
+        return {'statusCode': 409, 'body': json.dumps({'error': f"Snapshot at {destination} is {manifest['format']}, run with full=true to rewrite it"})}
+    manifest.setdefault('fingerprintShards', {})
+
+    run_id = datetime.utcnow().strftime("%Y%m%dT%H%M%S%fZ")
+    summary = {}
+    superseded = []
+    for name in exports:
+        previous = {} if full else read_fingerprints(destination, manifest, name)
+        fingerprints, written = export_table(destination, run_id, name, previous, total_segments, read_units_per_second)
+        deleted = [key for key in previous if key not in fingerprints]
+        changed = [key for key in fingerprints if previous.get(key) != fingerprints[key]]
+
+        if deleted:
+            write_file(destination, f"{name}/run={run_id}/{DELETES_FILE}", json.dumps(deleted).encode())
+        # A changed or deleted parent replaces every child row it had before.
+        for child in EXPORTS[name]['children']:
+            if changed or deleted:
+                write_file(destination, f"{child}/run={run_id}/{DELETES_FILE}", json.dumps(changed + deleted).encode())
+
+        # Written under this run, so a run cut short before the manifest leaves the old shards current.
+        shards = manifest['fingerprintShards'].setdefault(name, {})
+        if name in manifest.get('fingerprints', {}):
+            del manifest['fingerprints'][name]
+            changed_shards = range(FINGERPRINT_SHARDS)
+        else:
+            changed_shards = sorted({fingerprint_shard(key) for key in changed + deleted})
+        shard_fingerprints = {shard: {} for shard in changed_shards}
+        for key, fingerprint in fingerprints.items():
+            shard_fingerprints.get(fingerprint_shard(key), {})[key] = fingerprint
+        for shard, contents in shard_fingerprints.items():
+            write_file(destination, shard_path(name, run_id, shard), gzip.compress(json.dumps(contents).encode()))
+            if str(shard) in shards:
+                superseded.append(shard_path(name, shards[str(shard)], shard))
+            shards[str(shard)] = run_id
+        summary[name] = {'scanned': len(fingerprints), 'written': written, 'deleted': len(deleted)}
+        logger.info("Exported %s: %s", name, summary[name])
+
+    manifest['runs'].append(run_id)
+    manifest['format'] = file_format()
+    if not manifest.get('fingerprints', True):
+        del manifest['fingerprints']
+    write_file(destination, MANIFEST_FILE, json.dumps(manifest).encode())
+    for path in superseded:
+        delete_file(destination, path)
+
+    return {'statusCode': 200, 'body': json.dumps({'runID': run_id, 'format': file_format(), 'exports': summary})}
+
+def read_fingerprints(destination, manifest, name):
+    """Load the row fingerprints of an export from its current shards."""
+    # Manifests written before sharding hold full-length fingerprints inline.
+    if name in manifest.get('fingerprints', {}):
+        return {key: fingerprint[:FINGERPRINT_LENGTH] for key, fingerprint in manifest['fingerprints'][name].items()}
+    fingerprints = {}
+    for shard, run_id in manifest['fingerprintShards'].get(name, {}).items():
+        fingerprints.update(json.loads(gzip.decompress(read_file(destination, shard_path(name, run_id, int(shard))))))
+    return fingerprints
+
+def fingerprint_shard(key):
+    return int(hashlib.sha1(key.encode()).hexdigest()[:8], 16) % FINGERPRINT_SHARDS
+
+def shard_path(name, run_id, shard):
+    return f"{FINGERPRINTS_DIR}/{name}/run={run_id}/shard-{shard:03d}.json.gz"
+
+def export_table(destination, run_id, name, previous, total_segments, read_units_per_second):
+    """Scan one table segment by segment in threads; returns the new fingerprints and rows written."""
+    with ThreadPoolExecutor(max_workers=total_segments) as executor:
+        results = list(executor.map(
+            lambda segment: export_segment(destination, run_id, name, previous, segment, total_segments,
+                                           read_units_per_second / total_segments),
+            range(total_segments)
+        ))
+
+    fingerprints = {}
+    written = 0
+    for segment_fingerprints, segment_written in results:
+        fingerprints.update(segment_fingerprints)
+        written += segment_written
+    return fingerprints, written
+
+def export_segment(destination, run_id, name, previous, segment, total_segments, read_units_per_second):
+    # boto3 resources are not thread-safe, so every segment gets its own session.
+    table = boto3.session.Session().resource('dynamodb').Table(EXPORTS[name]['table'])
+    spec = EXPORTS[name]
+    scan_kwargs = {'Segment': segment, 'TotalSegments': total_segments, 'Limit': SCAN_PAGE_SIZE, 'ReturnConsumedCapacity': 'TOTAL'}
+    pacer = {'rate': read_units_per_second, 'next': time.monotonic()}
+
+    fingerprints = {}
+    buffers = {}
+    file_numbers = {}
+    written = 0
+    while True:
+        response = table.scan(**scan_kwargs)
+        for item in response['Items']:
+            key = key_string(item, spec['key'])
+            fingerprint = hashlib.sha1(json.dumps(item, sort_keys=True, default=stable_default).encode()).hexdigest()[:FINGERPRINT_LENGTH]
+            fingerprints[key] = fingerprint
+            if previous.get(key) == fingerprint:
+                continue
+
+            partition = spec['partition'](item)
+            buffers.setdefault((name, partition), []).append(plain(spec['row'](item)))
+            for child, child_rows in spec['children'].items():
+                buffers.setdefault((child, partition), []).extend(plain(row) for row in child_rows(item))
+            written += 1
+
+        for buffer_key, rows in buffers.items():
+            if len(rows) >= ROWS_PER_FILE:
+                flush_rows(destination, run_id, buffer_key, segment, file_numbers, rows)
+
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        wait_for_capacity(pacer, response.get('ConsumedCapacity', {}).get('CapacityUnits', 0))
+
+    for buffer_key, rows in buffers.items():
+        flush_rows(destination, run_id, buffer_key, segment, file_numbers, rows)
+    return fingerprints, written
+
+def wait_for_capacity(pacer, units):
+    """Hold the next scan page until the units this one consumed fit the segment's share of the read budget."""
+    now = time.monotonic()
+    pacer['next'] = max(pacer['next'], now) + units / pacer['rate']
+    if pacer['next'] > now:
+        time.sleep(pacer['next'] - now)
+
+def flush_rows(destination, run_id, buffer_key, segment, file_numbers, rows):
+    if not rows:
+        return
+    dataset, partition = buffer_key
+    number = file_numbers.get(buffer_key, 0)
+    file_numbers[buffer_key] = number + 1
+    path = f"{dataset}/run={run_id}/{partition}/part-{segment:04d}-{number:04d}{file_extension()}"
+    write_file(destination, path, encode_rows(rows))
+    rows.clear()
+
+def key_string(item, key_attributes):
+    return '|'.join(str(item[attribute]) for attribute in key_attributes)
+
+def plain(row):
+    """Turn DynamoDB values into column-friendly ones without losing digits, sets and maps to JSON text.
+
+    Parquet keeps Decimals as decimal columns; JSON lines get whole numbers as
+    integers and the rest as exact decimal strings.
+    """
+    converted = {}
+    for column, value in row.items():
+        if isinstance(value, Decimal):
+            if not pa:
+                value = int(value) if value == value.to_integral_value() else str(value)
+        elif isinstance(value, (set, list, dict)):
+            value = json.dumps(sorted(value) if isinstance(value, set) else value, default=stable_default)
+        converted[column] = value
+    return converted
+
+def stable_default(value):
+    """JSON fallback that renders sets in sorted order, so equal items always serialize (and fingerprint) the same."""
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    return str(value)
+
+def file_format():
+    return 'parquet' if pa else 'jsonl.gz'
+
+def file_extension():
+    return '.parquet' if pa else '.jsonl.gz'
+
+def encode_rows(rows):
+    if pa:
+        buffer = io.BytesIO()
+        pq.write_table(pa.Table.from_pylist(rows), buffer, compression='zstd')
+        return buffer.getvalue()
+    return gzip.compress(''.join(json.dumps(row) + '\n' for row in rows).encode())
+
+def decode_rows(path, data):
+    if path.endswith('.parquet'):
+        if not pa:
+            raise RuntimeError(f"Reading the Parquet snapshot file {path} needs pyarrow, which is not installed")
+        return pq.read_table(io.BytesIO(data)).to_pylist()
+    return [json.loads(line) for line in gzip.decompress(data).decode().splitlines() if line]
+
+def read_manifest(destination):
+    try:
+        return json.loads(read_file(destination, MANIFEST_FILE))
+    except (FileNotFoundError, s3.exceptions.NoSuchKey):
+        return {'runs': [], 'format': file_format(), 'fingerprintShards': {}}
+
+def split_s3(destination):
+    bucket, _, prefix = destination[len('s3://'):].partition('/')
+    return bucket, f"{prefix}/" if prefix else ''
+
+def write_file(destination, path, data):
+    if destination.startswith('s3://'):
+        bucket, prefix = split_s3(destination)
+        s3.put_object(Bucket=bucket, Key=prefix + path, Body=data)
+        return
+    full_path = os.path.join(destination, path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, 'wb') as f:
+        f.write(data)
+
+def delete_file(destination, path):
+    if destination.startswith('s3://'):
+        bucket, prefix = split_s3(destination)
+        s3.delete_object(Bucket=bucket, Key=prefix + path)
+        return
+    try:
+        os.remove(os.path.join(destination, path))
+    except FileNotFoundError:
+        pass
+
+def read_file(destination, path):
+    if destination.startswith('s3://'):
+        bucket, prefix = split_s3(destination)
+        return s3.get_object(Bucket=bucket, Key=prefix + path)['Body'].read()
+    with open(os.path.join(destination, path), 'rb') as f:
+        return f.read()
+
+def list_files(destination, prefix):
+    if destination.startswith('s3://'):
+        bucket, base = split_s3(destination)
+        paginator = s3.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=bucket, Prefix=base + prefix):
+            for obj in page.get('Contents', []):
+                yield obj['Key'][len(base):]
+        return
+    root = os.path.join(destination, prefix)
+    for directory, _, files in os.walk(root):
+        for file_name in files:
+            yield os.path.relpath(os.path.join(directory, file_name), destination)
+
+def read_snapshot(destination, dataset, partition=None, where=None, columns=None):
+    """Read the latest state of a dataset from a snapshot, merging incremental runs.
+
+    partition limits the files read (e.g. 'type=auction' or 'month=2024-05'),
+    where is an optional row predicate and columns an optional projection.
+    """
+    destination = destination.rstrip('/')
+    # Runs missing from the manifest were cut short or predate a full re-export.
+    runs = set(read_manifest(destination)['runs'])
+    key_attributes = EXPORTS[dataset]['key'] if dataset in EXPORTS else CHILD_KEYS[dataset]
+
+    # For every key only the rows of the newest run that touched it are current.
+    rows_by_run = {}
+    deletes_by_run = {}
+    for path in list_files(destination, f"{dataset}/"):
+        parts = path.split('/')
+        run_id = parts[1][len('run='):]
+        if run_id not in runs:
+            continue
+        if parts[-1] == DELETES_FILE:
+            deletes_by_run[run_id] = json.loads(read_file(destination, path))
+        elif partition is None or parts[2] == partition:
+            rows_by_run.setdefault(run_id, []).extend(decode_rows(path, read_file(destination, path)))
+
+    latest_run = {}
+    for run_id, keys in deletes_by_run.items():
+        for key in keys:
+            latest_run[key] = max(latest_run.get(key, ''), run_id)
+    for run_id, rows in rows_by_run.items():
+        for row in rows:
+            key = key_string(row, key_attributes)
+            latest_run[key] = max(latest_run.get(key, ''), run_id)
+
+    result = []
+    for run_id in sorted(rows_by_run):
+        for row in rows_by_run[run_id]:
+            if latest_run[key_string(row, key_attributes)] != run_id:
+                continue
+            if where and not where(row):
+                continue
+            result.append({column: row.get(column) for column in columns} if columns else row)
+    return result
@@ -3,6 +3,7 @@ import boto3
 import logging
 from decimal import Decimal
 import os
+from giftorbid_common.serialization import to_json
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -11,6 +12,8 @@ dynamodb = boto3.resource('dynamodb')
 
 DYNAMODB_LISTING_TABLE = os.environ['DYNAMODB_LISTING_TABLE']
 
+IMAGE_SIZES = ['thumbnail', 'card', 'full', 'original']
+
 def lambda_handler(event, context):
     try:
         logger.info("Received event: %s", json.dumps(event))
@@ -19,6 +22,7 @@ def lambda_handler(event, context):
         logger.info("Query parameters: %s", params)
 
         listing_id = params.get("listingID")
+        image_size = params.get("imageSize", "full")
 
         if not listing_id:
             logger.error("Missing 'listingID' in query parameters")
@@ -28,6 +32,14 @@ def lambda_handler(event, context):
                 "body": json.dumps({"error": "Missing 'listingID' in query parameters"})
             }
 
+        if image_size not in IMAGE_SIZES:
+            logger.error("Invalid imageSize: %s", image_size)
+            return {
+                "statusCode": 400,
+                "headers": {"Content-Type": "application/json"},
+                "body": json.dumps({"error": f"Invalid imageSize: {image_size}"})
+            }
+
         logger.info("Received listingID: %s", listing_id)
 
         table = dynamodb.Table(DYNAMODB_LISTING_TABLE)
@@ -41,13 +53,13 @@ def lambda_handler(event, context):
                 "body": json.dumps({"error": "Listing not found"})
             }
 
-        listing = response['Item']
+        listing = apply_image_size([response['Item']], image_size)[0]
         logger.info("Fetched listing: %s", listing)
 
         return {
             "statusCode": 200,
             "headers": {"Content-Type": "application/json"},
-            "body": json.dumps(listing, default=str)
+            "body": to_json(listing)
         }
 
     except Exception as e:
@@ -57,3 +69,14 @@ def lambda_handler(event, context):
             "headers": {"Content-Type": "application/json"},
             "body": json.dumps({"error": str(e)})
         }
+
+def apply_image_size(listings, image_size):
+    """Replace listing images with the requested resized variant, keeping the original where none has been generated."""
+    if image_size == 'original':
+        return listings
+    for listing in listings:
+        variants = listing.pop('imageVariants', None)
+        # Listings written before variants were keyed by image URL hold a list; serve their originals.
+        if isinstance(variants, dict):
+            listing['images'] = [variants.get(url, {}).get(image_size, url) for url in listing.get('images', [])]
+    return listings
@@ -1,10 +1,18 @@
 import json
 import boto3
 import logging
+import math
 from datetime import datetime
 from decimal import Decimal
-from boto3.dynamodb.conditions import Attr
+from boto3.dynamodb.conditions import Attr, Key
 import os
+import re
+import time
+import unicodedata
+from giftorbid_common.storage import batch_get_items
+from giftorbid_common.compression import compress_response
+from giftorbid_common.locations import location_key
+from giftorbid_common.pagination import encode_cursor, decode_cursor
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -12,6 +20,37 @@ logger.setLevel(logging.INFO)
 dynamodb = boto3.resource('dynamodb')
 
 DYNAMODB_LISTING_TABLE = os.environ['DYNAMODB_LISTING_TABLE']
+DYNAMODB_SEARCH_TABLE = os.environ['DYNAMODB_SEARCH_TABLE']
+DYNAMODB_AGGREGATES_TABLE = os.environ['DYNAMODB_AGGREGATES_TABLE']
+
+FACETS_AGGREGATE_ID = 'listing-facets'
+HOT_AUCTIONS_AGGREGATE_ID = 'hot-auctions'
+# Must match GIFTorBIDindexListings, which maintains the board.
+HOT_HALF_LIFE_SECONDS = 1800
+HOT_DECAY_RATE = math.log(2) / HOT_HALF_LIFE_SECONDS
+DEFAULT_TRENDING_LIMIT = 10
+MAX_TRENDING_LIMIT = 50
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+# Bounds the extra reads spent skipping listings that are no longer available.
+MAX_LOCATION_QUERY_PAGES = 5
+
+IMAGE_SIZES = ['thumbnail', 'card', 'full', 'original']
+
+# Must match the tokenizer in GIFTorBIDindexListings.
+MIN_PREFIX_LENGTH = 2
+MAX_PREFIX_LENGTH = 15
+MAX_QUERY_TERMS = 5
+# Postings read per term, best scores first; bounds query cost regardless of catalog size.
+MAX_POSTINGS_PER_TERM = 500
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 50
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+STOPWORDS = {
+    'si', 'sau', 'de', 'la', 'in', 'din', 'cu', 'pe', 'pentru', 'un', 'una', 'o', 'ale', 'al', 'a', 'care', 'este', 'sunt',
+    'the', 'and', 'or', 'of', 'for', 'with', 'to', 'an', 'is', 'are'
+}
 
 def lambda_handler(event, context):
     try:
@@ -19,16 +58,35 @@ def lambda_handler(event, context):
         path = event.get('resource', '')       
         logger.info("Received path: %s", path)
         
+        params = event.get("queryStringParameters", {}) or {}
+        image_size = params.get("imageSize", "thumbnail")
+        if image_size not in IMAGE_SIZES:
+            return {"statusCode": 400, "body": json.dumps({"error": f"Invalid imageSize: {image_size}"})}
+
         table = dynamodb.Table(DYNAMODB_LISTING_TABLE)
 
-        if path == "/listings/donations":
-            return fetch_listings_by_type(table, 'donation')
+        # The fetchers return unencoded payloads; compress_response serializes them, streaming large lists.
+        if path in ["/listings/donations", "/listings/auctions"] and params.get("country"):
+            listing_type = 'donation' if path == "/listings/donations" else 'auction'
+            return compress_response(fetch_listings_by_location(table, listing_type, params, image_size), event)
+
+        elif path == "/listings/donations":
+            return compress_response(fetch_listings_by_type(table, 'donation', image_size), event)
 
         elif path == "/listings/auctions":
-            return fetch_listings_by_type(table, 'auction')
+            return compress_response(fetch_listings_by_type(table, 'auction', image_size), event)
 
         elif path == "/listings":
-            return fetch_listings_today(table)
+            return compress_response(fetch_listings_today(table, image_size), event)
+
+        elif path == "/listings/search":
+            return compress_response(search_listings(params, image_size), event)
+
+        elif path == "/listings/facets":
+            return fetch_facets(params)
+
+        elif path == "/listings/trending":
+            return compress_response(fetch_trending(params), event)
 
         else:
             return {"statusCode": 404, "body": json.dumps({"error": "Resource not found"})}
@@ -37,19 +95,64 @@ def lambda_handler(event, context):
         logger.error("Error: %s", str(e))
         return {"statusCode": 500, "body": json.dumps({"error": str(e)})}
 
-def fetch_listings_by_type(table, listing_type):
+def fetch_listings_by_type(table, listing_type, image_size):
     response = table.scan(
         FilterExpression=boto3.dynamodb.conditions.Attr('type').eq(listing_type) & Attr('status').is_in(['available', 'redeemed'])
     )
     logger.info("DynamoDB %s response: %s",listing_type, response)
-    listings = response['Items']
+    listings = apply_image_size(response['Items'], image_size)
     logger.info("Fetched %d %s listings: %s", len(listings), listing_type, listings)
     return {
         "statusCode": 200,
-        "body": json.dumps(listings, default=str)
+        "body": listings
     }
 
-def fetch_listings_today(table):
+def fetch_listings_by_location(table, listing_type, params, image_size):
+    """Page through the location-index for a country, optionally narrowed to a county and city."""
+    partition = f"{listing_type}#{location_key(params['country'])}"
+    try:
+        limit = min(int(params.get("limit", DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        exclusive_start_key = decode_cursor(params.get("cursor"), {'listingID', 'locationPartition', 'locationSort'}, {'locationPartition': partition})
+    except ValueError:
+        return {"statusCode": 400, "body": json.dumps({"error": "Invalid 'limit' or 'cursor' in query parameters"})}
+
+    key_condition = Key('locationPartition').eq(partition)
+    if params.get("county"):
+        sort_prefix = f"{location_key(params['county'])}#"
+        if params.get("city"):
+            sort_prefix += f"{location_key(params['city'])}#"
+        key_condition = key_condition & Key('locationSort').begins_with(sort_prefix)
+
+    query_kwargs = {
+        'IndexName': 'location-index',
+        'KeyConditionExpression': key_condition,
+        'FilterExpression': Attr('status').is_in(['available', 'redeemed'])
+    }
+    if exclusive_start_key:
+        query_kwargs['ExclusiveStartKey'] = exclusive_start_key
+
+    # Limit counts items before the status filter, so keep reading until the page is full.
+    listings = []
+    last_evaluated_key = None
+    for _ in range(MAX_LOCATION_QUERY_PAGES):
+        response = table.query(Limit=max(limit - len(listings), 1), **query_kwargs)
+        listings.extend(response['Items'])
+        last_evaluated_key = response.get('LastEvaluatedKey')
+        if not last_evaluated_key or len(listings) >= limit:
+            break
+        query_kwargs['ExclusiveStartKey'] = last_evaluated_key
+
+    listings = apply_image_size(listings, image_size)
+    logger.info("Fetched %d %s listings in %s", len(listings), listing_type, partition)
+    return {
+        "statusCode": 200,
+        "body": {
+            "listings": listings,
+            "nextCursor": encode_cursor(last_evaluated_key)
+        }
+    }
+
+def fetch_listings_today(table, image_size):
     today = datetime.now().strftime("%Y-%m-%d")
 
     response_today = table.scan(
@@ -60,17 +163,138 @@ def fetch_listings_today(table):
         FilterExpression=Attr('type').eq('auction') & Attr('endDate').begins_with(today) & Attr('status').is_in(['available', 'redeemed'])
     )
 
-    listings_today = response_today.get('Items', [])
-    auctions_ending_today = response_ending_today.get('Items', [])
+    listings_today = apply_image_size(response_today.get('Items', []), image_size)
+    auctions_ending_today = apply_image_size(response_ending_today.get('Items', []), image_size)
 
     logger.info("Fetched %d non-auction listings created today and %d auctions ending today", 
                 len(listings_today), len(auctions_ending_today))
 
     return {
         "statusCode": 200,
-        "body": json.dumps({
+        "body": {
             "listingsToday": listings_today,
             "auctionsEndingToday": auctions_ending_today
-        }, default=str)
+        }
+    }
+
+def apply_image_size(listings, image_size):
+    """Replace listing images with the requested resized variant, keeping the original where none has been generated."""
+    if image_size == 'original':
+        return listings
+    for listing in listings:
+        variants = listing.pop('imageVariants', None)
+        # Listings written before variants were keyed by image URL hold a list; serve their originals.
+        if isinstance(variants, dict):
+            listing['images'] = [variants.get(url, {}).get(image_size, url) for url in listing.get('images', [])]
+    return listings
+
+def search_listings(params, image_size):
+    """Answer a text query from the inverted index: intersect the terms' postings, rank, then hydrate."""
+    terms = list(dict.fromkeys(token[:MAX_PREFIX_LENGTH] for token in tokenize(params.get("q", ""))))[:MAX_QUERY_TERMS]
+    if not terms:
+        return {"statusCode": 400, "body": json.dumps({"error": "Query must contain at least one word of 2 or more letters"})}
+
+    listing_type = params.get("type")
+    try:
+        limit = min(int(params.get("limit", DEFAULT_SEARCH_LIMIT)), MAX_SEARCH_LIMIT)
+    except ValueError:
+        return {"statusCode": 400, "body": json.dumps({"error": "limit must be a number"})}
+
+    search_table = dynamodb.Table(DYNAMODB_SEARCH_TABLE)
+    scores = None
+    for term in terms:
+        term_scores = {}
+        postings_read = 0
+        query_kwargs = {
+            'KeyConditionExpression': Key('term').eq(term),
+            'ProjectionExpression': 'listingID, score, #type',
+            'ExpressionAttributeNames': {'#type': 'type'},
+            'ScanIndexForward': False
+        }
+        # Bound the postings read, not the ones kept: a type filter must not turn a common term into a full read.
+        while postings_read < MAX_POSTINGS_PER_TERM:
+            response = search_table.query(Limit=MAX_POSTINGS_PER_TERM - postings_read, **query_kwargs)
+            postings_read += len(response['Items'])
+            for posting in response['Items']:
+                if not listing_type or posting['type'] == listing_type:
+                    term_scores[posting['listingID']] = posting['score']
+            if 'LastEvaluatedKey' not in response:
+                break
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+        if scores is None:
+            scores = term_scores
+        else:
+            scores = {listing_id: score + term_scores[listing_id] for listing_id, score in scores.items() if listing_id in term_scores}
+        if not scores:
+            break
+
+    ranked_ids = sorted(scores, key=lambda listing_id: (-scores[listing_id], listing_id))[:limit]
+    listings = {}
+    if ranked_ids:
+        items = batch_get_items({DYNAMODB_LISTING_TABLE: {'Keys': [{'listingID': listing_id} for listing_id in ranked_ids]}})
+        listings = {listing['listingID']: listing for listing in items[DYNAMODB_LISTING_TABLE]}
+
+    # The index can briefly lag the table; drop hits that are gone or no longer listed.
+    results = [listings[listing_id] for listing_id in ranked_ids
+               if listing_id in listings and listings[listing_id].get('status') in ['available', 'redeemed']]
+    results = apply_image_size(results, image_size)
+    logger.info("Search %s matched %d listings, returning %d", terms, len(scores), len(results))
+
+    return {
+        "statusCode": 200,
+        "body": {"listings": results, "total": len(scores)}
+    }
+
+def fetch_facets(params):
+    """Return listing counts per type, category and status from the stream-maintained facets item."""
+    statuses = params.get("status", "available,redeemed").split(",")
+    aggregates_table = dynamodb.Table(DYNAMODB_AGGREGATES_TABLE)
+    item = aggregates_table.get_item(Key={'aggregateID': FACETS_AGGREGATE_ID}).get('Item', {})
+
+    facets = {}
+    for attribute, count in item.items():
+        if attribute.count('#') != 2 or count <= 0:
+            continue
+        listing_type, category, status = attribute.split('#')
+        if status not in statuses:
+            continue
+        categories = facets.setdefault(listing_type, {})
+        categories[category] = categories.get(category, 0) + int(count)
+
+    return {
+        "statusCode": 200,
+        "body": json.dumps({"statuses": statuses, "facets": facets, "reconciledAt": item.get('reconciledAt')})
+    }
+
+def fetch_trending(params):
+    """Return the hottest running auctions from the stream-maintained hot-auctions item in one read."""
+    try:
+        limit = min(max(int(params.get("limit", DEFAULT_TRENDING_LIMIT)), 1), MAX_TRENDING_LIMIT)
+    except ValueError:
+        return {"statusCode": 400, "body": json.dumps({"error": "Invalid 'limit' in query parameters"})}
+
+    aggregates_table = dynamodb.Table(DYNAMODB_AGGREGATES_TABLE)
+    item = aggregates_table.get_item(Key={'aggregateID': HOT_AUCTIONS_AGGREGATE_ID}).get('Item', {})
+
+    # Stored scores are relative to the landmark; scaling them to now keeps the order and gives comparable numbers.
+    decay = math.exp(-HOT_DECAY_RATE * (time.time() - float(item.get('landmark', time.time()))))
+    now_iso = datetime.utcnow().isoformat() + "Z"
+    auctions = [
+        {**entry, 'listingID': listing_id, 'score': round(float(entry['score']) * decay, 3)}
+        for listing_id, entry in item.get('entries', {}).items()
+        if entry.get('endDate', '') > now_iso
+    ]
+    auctions.sort(key=lambda auction: auction['score'], reverse=True)
+
+    return {
+        "statusCode": 200,
+        "headers": {"Content-Type": "application/json"},
+        "body": {"auctions": auctions[:limit], "updatedAt": item.get('updatedAt')}
     }
 
+def tokenize(text):
+    """Lowercase, fold diacritics (ă â î ș ț and the cedilla forms) and drop stopwords."""
+    folded = unicodedata.normalize('NFKD', text.lower())
+    folded = ''.join(char for char in folded if not unicodedata.combining(char))
+    return [token for token in TOKEN_PATTERN.findall(folded) if len(token) >= MIN_PREFIX_LENGTH and token not in STOPWORDS]
@@ -3,6 +3,7 @@ import boto3
 import logging
 from decimal import Decimal
 import os
+from giftorbid_common.serialization import to_json
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -52,7 +53,7 @@ def lambda_handler(event, context):
         return {
             "statusCode": 200,
             "headers": {"Content-Type": "application/json"},
-            "body": json.dumps(user, default=str)
+            "body": to_json(user)
         }
 
     except Exception as e:
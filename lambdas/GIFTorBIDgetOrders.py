@@ -3,8 +3,11 @@ import boto3
 import uuid
 import base64
 from datetime import datetime, timedelta
+from boto3.dynamodb.conditions import Key
 import logging
 import os
+from giftorbid_common.pagination import encode_cursor, decode_cursor
+from giftorbid_common.auth import authorized_email, authorized_groups
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -13,61 +16,64 @@ dynamodb = boto3.resource('dynamodb')
 
 DYNAMODB_USER_TABLE = os.environ['DYNAMODB_USER_TABLE']
 DYNAMODB_ORDER_TABLE = os.environ['DYNAMODB_ORDER_TABLE']
+# Cognito group whose members may look up any order's pickup and drop points by AWB.
+COURIER_GROUP = os.environ.get('COURIER_GROUP', 'couriers')
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+# Orders indexes keyed by the party's email and sorted by orderDate.
+ROLE_INDEXES = {
+    'seller': ('sellerEmail', 'sellerEmail-orderDate-index'),
+    'redeemer': ('redeemerEmail', 'redeemerEmail-orderDate-index')
+}
+ORDER_ATTRIBUTES = "orderID, listingID, awb, orderDate, expirationDate, sellerEmail, redeemerEmail, sellerReviewed, redeemerReviewed, cost"
 
 def lambda_handler(event, context):
     try:
         logger.info("Received event: %s", json.dumps(event))
 
+        path = event.get('resource', '')
         params = event.get("queryStringParameters", {}) or {}
         logger.info("Query parameters: %s", params)
 
+        if path == "/orders/awb":
+            return fetch_order_by_awb(params.get("awb"), event.get('requestContext', {}).get('authorizer') or {})
+
         user_id = params.get("userID")
         order_id = params.get("orderID")
 
-        if not user_id and not order_id:
-            logger.error("Missing required parameters: userID or orderID")
+        if not user_id:
+            logger.error("Missing required parameter: userID")
             return {"statusCode": 400, "body": json.dumps({"error": "Missing required parameters"})}
 
         user_table = dynamodb.Table(DYNAMODB_USER_TABLE)
         user_response = user_table.query(
             IndexName='userID-index',
             KeyConditionExpression='userID = :uid',
+            ProjectionExpression='userEmail',
             ExpressionAttributeValues={':uid': user_id},
         )
 
-        user = user_response['Items'][0]
+        if not user_response['Items']:
+            return {"statusCode": 404, "body": json.dumps({"error": "User not found"})}
+        user_email = user_response['Items'][0]['userEmail']
 
-        logger.info("Fetched user: %s", user)
+        if not order_id:
+            return fetch_user_orders(user_email, params)
 
         order_id = f"order-{order_id}"
         order_table = dynamodb.Table(DYNAMODB_ORDER_TABLE)
-        order_response = order_table.get_item(Key={'orderID': order_id})
+        order_response = order_table.get_item(Key={'orderID': order_id}, ProjectionExpression=ORDER_ATTRIBUTES)
         if 'Item' not in order_response:
                 return {"statusCode": 404, "body": json.dumps({"error": "Order not found"})}
         order = order_response.get('Item')
 
-        logger.info("Fetched order: %s", order)
-
-        if order['sellerEmail'] == user['userEmail']:
-            response_data = {
-                'awb': order['awb'],
-                'expirationDate': order['expirationDate'],
-                'orderID': order['orderID'],
-                'redeemerReviewed': order['redeemerReviewed'],
-                'cost': str(order['cost'])
-            }
-
-        elif order['redeemerEmail'] == user['userEmail']:
-            response_data = {
-                'awb': order['awb'],
-                'expirationDate': order['expirationDate'],
-                'orderID': order['orderID'],
-                'sellerReviewed': order['sellerReviewed'],
-                'cost': str(order['cost'])
-            }
-        else:
-            return {"statusCode": 403, "body": json.dumps({"error": "Access denied"})} 
-        
+        logger.info("Fetched order: %s", order['orderID'])
+
+        response_data = order_view(order, user_email)
+        if response_data is None:
+            return {"statusCode": 403, "body": json.dumps({"error": "Access denied"})}
+
         return {
             "statusCode": 200,
             "headers": {"Content-Type": "application/json"},
@@ -80,4 +86,98 @@ def lambda_handler(event, context):
             "statusCode": 500,
             "headers": {"Content-Type": "application/json"},
             "body": json.dumps({"error": str(e)})
-        }
\ No newline at end of file
+        }
+
+def fetch_user_orders(user_email, params):
+    """Page through the user's orders as seller or redeemer, newest first."""
+    role = params.get("role")
+    if role not in ROLE_INDEXES:
+        return {"statusCode": 400, "body": json.dumps({"error": "Query parameter 'role' must be 'seller' or 'redeemer'"})}
+    email_attribute, index_name = ROLE_INDEXES[role]
+
+    try:
+        limit = min(int(params.get("limit", DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+        exclusive_start_key = decode_cursor(params.get("cursor"), {'orderID', email_attribute, 'orderDate'}, {email_attribute: user_email})
+    except ValueError:
+        return {"statusCode": 400, "body": json.dumps({"error": "Invalid 'limit' or 'cursor' in query parameters"})}
+
+    query_kwargs = {
+        'IndexName': index_name,
+        'KeyConditionExpression': Key(email_attribute).eq(user_email),
+        'ProjectionExpression': ORDER_ATTRIBUTES,
+        'ScanIndexForward': False,
+        'Limit': max(limit, 1)
+    }
+    if exclusive_start_key:
+        query_kwargs['ExclusiveStartKey'] = exclusive_start_key
+
+    order_table = dynamodb.Table(DYNAMODB_ORDER_TABLE)
+    response = order_table.query(**query_kwargs)
+    orders = [order_view(order, user_email) for order in response['Items']]
+    logger.info("Fetched %d orders of %s as %s", len(orders), user_email, role)
+
+    return {
+        "statusCode": 200,
+        "headers": {"Content-Type": "application/json"},
+        "body": json.dumps({
+            "orders": orders,
+            "nextCursor": encode_cursor(response.get('LastEvaluatedKey'))
+        })
+    }
+
+def fetch_order_by_awb(awb, authorizer):
+    """Resolve a courier AWB to its order through the awb-index, for couriers and the order's parties only.
+
+    The response carries both parties' addresses, so the caller must be
+    authenticated and either in COURIER_GROUP or the order's seller or redeemer.
+    """
+    if not awb:
+        return {"statusCode": 400, "body": json.dumps({"error": "Missing required parameter: awb"})}
+
+    caller_email = authorized_email(authorizer)
+    if not caller_email:
+        return {"statusCode": 401, "body": json.dumps({"error": "Authentication required"})}
+
+    order_table = dynamodb.Table(DYNAMODB_ORDER_TABLE)
+    response = order_table.query(
+        IndexName='awb-index',
+        KeyConditionExpression=Key('awb').eq(awb),
+        ProjectionExpression="orderID, listingID, awb, orderDate, expirationDate, pickupPoint, dropPoint, sellerEmail, redeemerEmail"
+    )
+    # Unknown AWBs and other people's orders look the same, so AWBs cannot be probed.
+    order = response['Items'][0] if response['Items'] else None
+    if not order or (COURIER_GROUP not in authorized_groups(authorizer)
+                     and caller_email not in (order.get('sellerEmail'), order.get('redeemerEmail'))):
+        return {"statusCode": 404, "body": json.dumps({"error": "Order not found"})}
+
+    order.pop('sellerEmail', None)
+    order.pop('redeemerEmail', None)
+    return {
+        "statusCode": 200,
+        "headers": {"Content-Type": "application/json"},
+        "body": json.dumps(order, default=str)
+    }
+
+def order_view(order, user_email):
+    """The fields of an order its seller or redeemer may see; None for anyone else."""
+    if order['sellerEmail'] == user_email:
+        return {
+            'awb': order['awb'],
+            'expirationDate': order['expirationDate'],
+            'orderID': order['orderID'],
+            'listingID': order['listingID'],
+            'orderDate': order['orderDate'],
+            'redeemerReviewed': order['redeemerReviewed'],
+            'cost': str(order['cost'])
+        }
+    if order['redeemerEmail'] == user_email:
+        return {
+            'awb': order['awb'],
+            'expirationDate': order['expirationDate'],
+            'orderID': order['orderID'],
+            'listingID': order['listingID'],
+            'orderDate': order['orderDate'],
+            'sellerReviewed': order['sellerReviewed'],
+            'cost': str(order['cost'])
+        }
+    return None
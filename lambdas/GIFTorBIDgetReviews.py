@@ -3,8 +3,10 @@ import boto3
 import logging
 from datetime import datetime
 from decimal import Decimal
-from boto3.dynamodb.conditions import Attr
+from boto3.dynamodb.conditions import Attr, Key
 import os
+from giftorbid_common.serialization import to_json
+from giftorbid_common.pagination import encode_cursor, decode_cursor
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -12,6 +14,11 @@ logger.setLevel(logging.INFO)
 dynamodb = boto3.resource('dynamodb')
 
 DYNAMODB_USERS_TABLE = os.environ['DYNAMODB_USERS_TABLE']
+DYNAMODB_REVIEWS_TABLE = os.environ['DYNAMODB_REVIEWS_TABLE']
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+HISTOGRAM_ATTRIBUTES = [f"rating{star}Count" for star in range(1, 6)]
 
 def lambda_handler(event, context):
     try:
@@ -21,6 +28,7 @@ def lambda_handler(event, context):
         logger.info("Query parameters: %s", params)
 
         user_email = params.get("userEmail")
+        summary_only = params.get("summaryOnly", "false").lower() == "true"
 
         if not user_email:
             logger.error("Missing 'userEmail' in query parameters")
@@ -30,10 +38,25 @@ def lambda_handler(event, context):
                 "body": json.dumps({"error": "Missing 'userEmail' in query parameters"})
             }
 
+        try:
+            limit = min(int(params.get("limit", DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+            exclusive_start_key = decode_cursor(params.get("cursor"), {'reviewedEmail', 'reviewID'}, {'reviewedEmail': user_email})
+        except ValueError:
+            logger.error("Invalid pagination parameters: %s", params)
+            return {
+                "statusCode": 400,
+                "headers": {"Content-Type": "application/json"},
+                "body": json.dumps({"error": "Invalid 'limit' or 'cursor' in query parameters"})
+            }
+
         logger.info("Received userEmail: %s", user_email)
 
         users_table = dynamodb.Table(DYNAMODB_USERS_TABLE)
-        users_response = users_table.get_item(Key={'userEmail': user_email})
+        users_response = users_table.get_item(
+            Key={'userEmail': user_email},
+            ProjectionExpression="#name, phoneNumber, averageRating, ratingSum, ratingCount, " + ", ".join(HISTOGRAM_ATTRIBUTES),
+            ExpressionAttributeNames={"#name": "name"}
+        )
 
         if 'Item' not in users_response:
             logger.error("User not found: %s", user_email)
@@ -46,17 +69,36 @@ def lambda_handler(event, context):
         user = users_response['Item']
         logger.info("Fetched user: %s", user)
 
+        rating_count = user.get('ratingCount', 0)
         response_data = {
-            'averageRating': user['averageRating'],
-            'reviews': user['reviews'],
-            'phoneNumber': user['phoneNumber'],
+            'averageRating': average_rating(user),
+            'ratingCount': rating_count,
+            'ratingHistogram': {str(star): user.get(f"rating{star}Count", 0) for star in range(1, 6)},
             'userName': user['name']
         }
 
+        if not summary_only:
+            query_kwargs = {
+                'KeyConditionExpression': Key('reviewedEmail').eq(user_email),
+                'ScanIndexForward': False,
+                'Limit': max(limit, 1)
+            }
+            if exclusive_start_key:
+                query_kwargs['ExclusiveStartKey'] = exclusive_start_key
+
+            reviews_table = dynamodb.Table(DYNAMODB_REVIEWS_TABLE)
+            reviews_response = reviews_table.query(**query_kwargs)
+
+            response_data.update({
+                'reviews': reviews_response['Items'],
+                'nextCursor': encode_cursor(reviews_response.get('LastEvaluatedKey')),
+                'phoneNumber': user['phoneNumber']
+            })
+
         return {
             "statusCode": 200,
             "headers": {"Content-Type": "application/json"},
-            "body": json.dumps(response_data, default=str)
+            "body": to_json(response_data)
         }
     
     except Exception as e:
@@ -65,4 +107,13 @@ def lambda_handler(event, context):
             "statusCode": 500,
             "headers": {"Content-Type": "application/json"},
             "body": json.dumps({"error": str(e)})
-        }
\ No newline at end of file
+        }
+
+def average_rating(user):
+    """Derive the average rating from the ratingSum/ratingCount counters."""
+    rating_count = user.pop('ratingCount', 0)
+    rating_sum = user.pop('ratingSum', 0)
+    if not rating_count:
+        return user.pop('averageRating', 0)
+    user.pop('averageRating', None)
+    return round(rating_sum / rating_count, 1)
@@ -3,6 +3,7 @@ import boto3
 import logging
 from decimal import Decimal
 import os
+from giftorbid_common.serialization import to_json
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -35,7 +36,7 @@ def lambda_handler(event, context):
             IndexName='userID-index',
             KeyConditionExpression='userID = :uid',
             ExpressionAttributeValues={':uid': user_id},
-            ProjectionExpression="country, county, city, address, postalCode, averageRating, listingsIDs, redeemedIDs"
+            ProjectionExpression="country, county, city, address, postalCode, averageRating, ratingSum, ratingCount, listingsIDs, redeemedIDs"
         )
 
         if not response.get('Items'):
@@ -47,12 +48,15 @@ def lambda_handler(event, context):
             }
 
         user = response['Items'][0]
+        user['averageRating'] = average_rating(user)
+        for attribute in ['listingsIDs', 'redeemedIDs']:
+            user[attribute] = sorted(user.get(attribute, []))
         logger.info("Fetched user: %s", user)
 
         return {
             "statusCode": 200,
             "headers": {"Content-Type": "application/json"},
-            "body": json.dumps(user, default=str)
+            "body": to_json(user)
         }
 
     except Exception as e:
@@ -62,3 +66,12 @@ def lambda_handler(event, context):
             "headers": {"Content-Type": "application/json"},
             "body": json.dumps({"error": str(e)})
         }
+
+def average_rating(user):
+    """Derive the average rating from the ratingSum/ratingCount counters."""
+    rating_count = user.pop('ratingCount', 0)
+    rating_sum = user.pop('ratingSum', 0)
+    if not rating_count:
+        return user.pop('averageRating', 0)
+    user.pop('averageRating', None)
+    return round(rating_sum / rating_count, 1)
@@ -0,0 +1,373 @@
+import json
+import boto3
+from boto3.dynamodb.conditions import Attr
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+from datetime import datetime, timezone
+from decimal import Decimal
+import logging
+import math
+import os
+import re
+import time
+import unicodedata
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+dynamodb = boto3.resource('dynamodb')
+deserializer = TypeDeserializer()
+
+DYNAMODB_LISTING_TABLE = os.environ['DYNAMODB_LISTING_TABLE']
+DYNAMODB_SEARCH_TABLE = os.environ['DYNAMODB_SEARCH_TABLE']
+DYNAMODB_AGGREGATES_TABLE = os.environ['DYNAMODB_AGGREGATES_TABLE']
+
+FACETS_AGGREGATE_ID = 'listing-facets'
+HOT_AUCTIONS_AGGREGATE_ID = 'hot-auctions'
+
+# Bid weights halve every half-life (forward decay), so the ranking follows recent activity.
+HOT_HALF_LIFE_SECONDS = 1800
+HOT_DECAY_RATE = math.log(2) / HOT_HALF_LIFE_SECONDS
+# Each bid weighs 1 plus this much per unit of relative rise over the previous highest bid.
+PRICE_GROWTH_WEIGHT = 2
+# Auctions kept on the board; the weakest is evicted when a hotter one arrives.
+HOT_CAPACITY = 100
+# Scores are stored relative to a landmark time and rebased once they grow by e ** HOT_REBASE_EXPONENT.
+HOT_REBASE_EXPONENT = 20
+HOT_UPDATE_ATTEMPTS = 5
+
+SEARCHABLE_STATUSES = ['available', 'redeemed']
+FIELD_WEIGHTS = {'name': 3, 'category': 2, 'description': 1}
+MIN_PREFIX_LENGTH = 2
+MAX_PREFIX_LENGTH = 15
+MAX_DESCRIPTION_TOKENS = 200
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+STOPWORDS = {
+    'si', 'sau', 'de', 'la', 'in', 'din', 'cu', 'pe', 'pentru', 'un', 'una', 'o', 'ale', 'al', 'a', 'care', 'este', 'sunt',
+    'the', 'and', 'or', 'of', 'for', 'with', 'to', 'an', 'is', 'are'
+}
+# Stop scanning with this much invocation time left and hand back the resume key.
+MIN_REMAINING_TIME_MS = 30000
+
+def lambda_handler(event, context):
+    """Keep the listing search index and facet counters in sync with the listings table stream.
+
+    Invoked with {"rebuild": true} it instead re-indexes every listing from a
+    table scan, then deletes the postings the rebuild did not write; re-invoke
+    with the "resume" event of the response until it is null.
+    {"reconcileFacets": true} recounts the facets from a scan to correct any drift.
+    """
+    if event.get('rebuild'):
+        return rebuild_index(event, context)
+    if event.get('reconcileFacets'):
+        return reconcile_facets()
+
+    records = event.get('Records', [])
+    search_table = dynamodb.Table(DYNAMODB_SEARCH_TABLE)
+    written = 0
+    deleted = 0
+    indexed_at = datetime.utcnow().isoformat() + "Z"
+    facet_deltas = {}
+    hot_activity = []
+
+    with search_table.batch_writer(overwrite_by_pkeys=['term', 'rank']) as batch:
+        for record in records:
+            old_listing = deserialize(record['dynamodb'].get('OldImage', {}))
+            new_listing = deserialize(record['dynamodb'].get('NewImage', {}))
+            for facet, delta in [(listing_facet(old_listing), -1), (listing_facet(new_listing), 1)]:
+                if facet:
+                    facet_deltas[facet] = facet_deltas.get(facet, 0) + delta
+            activity = bid_activity(old_listing, new_listing)
+            if activity:
+                hot_activity.append(activity)
+
+            old_postings = listing_postings(old_listing)
+            new_postings = listing_postings(new_listing)
+
+            for key in old_postings.keys() - new_postings.keys():
+                batch.delete_item(Key={'term': key[0], 'rank': key[1]})
+                deleted += 1
+            for key, posting in new_postings.items():
+                if old_postings.get(key) != posting:
+                    batch.put_item(Item={**posting, 'indexedAt': indexed_at})
+                    written += 1
+
+    update_facets(facet_deltas)
+    update_hot_auctions(hot_activity)
+
+    logger.info("Indexed %d listing changes: %d postings written, %d deleted", len(records), written, deleted)
+    return {'statusCode': 200, 'body': json.dumps(f"Indexed {len(records)} listing changes.")}
+
+def rebuild_index(event, context):
+    """Re-index every listing, then sweep out the postings older than the rebuild.
+
+    Every posting carries indexedAt, so one not rewritten since the rebuild
+    started belongs to a listing or term that no longer exists.
+    """
+    listings_table = dynamodb.Table(DYNAMODB_LISTING_TABLE)
+    search_table = dynamodb.Table(DYNAMODB_SEARCH_TABLE)
+    started_at = event.get('rebuildStartedAt') or datetime.utcnow().isoformat() + "Z"
+
+    indexed = 0
+    deleted = 0
+    resume = None
+    if not event.get('sweep'):
+        scan_kwargs = {
+            'ProjectionExpression': 'listingID, #name, #description, category, #type, #status',
+            'ExpressionAttributeNames': {'#name': 'name', '#description': 'description', '#type': 'type', '#status': 'status'}
+        }
+        if event.get('lastEvaluatedKey'):
+            scan_kwargs['ExclusiveStartKey'] = event['lastEvaluatedKey']
+
+        with search_table.batch_writer(overwrite_by_pkeys=['term', 'rank']) as batch:
+            while True:
+                response = listings_table.scan(**scan_kwargs)
+                indexed_at = datetime.utcnow().isoformat() + "Z"
+                for listing in response['Items']:
+                    postings = listing_postings(listing)
+                    for posting in postings.values():
+                        batch.put_item(Item={**posting, 'indexedAt': indexed_at})
+                    if postings:
+                        indexed += 1
+
+                last_evaluated_key = response.get('LastEvaluatedKey')
+                if not last_evaluated_key:
+                    break
+                if context.get_remaining_time_in_millis() < MIN_REMAINING_TIME_MS:
+                    resume = {'rebuild': True, 'rebuildStartedAt': started_at, 'lastEvaluatedKey': last_evaluated_key}
+                    break
+                scan_kwargs['ExclusiveStartKey'] = last_evaluated_key
+
+    if resume is None:
+        sweep_kwargs = {
+            'ProjectionExpression': '#term, #rank',
+            'FilterExpression': Attr('indexedAt').not_exists() | Attr('indexedAt').lt(started_at),
+            'ExpressionAttributeNames': {'#term': 'term', '#rank': 'rank'}
+        }
+        if event.get('sweep') and event.get('lastEvaluatedKey'):
+            sweep_kwargs['ExclusiveStartKey'] = event['lastEvaluatedKey']
+
+        with search_table.batch_writer(overwrite_by_pkeys=['term', 'rank']) as batch:
+            while True:
+                response = search_table.scan(**sweep_kwargs)
+                for posting in response['Items']:
+                    batch.delete_item(Key={'term': posting['term'], 'rank': posting['rank']})
+                    deleted += 1
+
+                last_evaluated_key = response.get('LastEvaluatedKey')
+                if not last_evaluated_key:
+                    break
+                if context.get_remaining_time_in_millis() < MIN_REMAINING_TIME_MS:
+                    resume = {'rebuild': True, 'rebuildStartedAt': started_at, 'sweep': True, 'lastEvaluatedKey': last_evaluated_key}
+                    break
+                sweep_kwargs['ExclusiveStartKey'] = last_evaluated_key
+
+    logger.info("Re-indexed %d listings and deleted %d stale postings, resume: %s", indexed, deleted, resume)
+    return {
+        'statusCode': 200,
+        'body': json.dumps({'indexedListings': indexed, 'deletedPostings': deleted, 'resume': resume}, default=str)
+    }
+
+def reconcile_facets():
+    """Recount every facet from a scan and overwrite the counters."""
+    listings_table = dynamodb.Table(DYNAMODB_LISTING_TABLE)
+    scan_kwargs = {
+        'ProjectionExpression': 'listingID, category, #type, #status',
+        'ExpressionAttributeNames': {'#type': 'type', '#status': 'status'}
+    }
+
+    counts = {}
+    while True:
+        response = listings_table.scan(**scan_kwargs)
+        for listing in response['Items']:
+            facet = listing_facet(listing)
+            counts[facet] = counts.get(facet, 0) + 1
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    # Changes streamed in while the scan ran may be counted twice or missed until the next pass.
+    aggregates_table = dynamodb.Table(DYNAMODB_AGGREGATES_TABLE)
+    aggregates_table.put_item(Item={
+        **counts,
+        'aggregateID': FACETS_AGGREGATE_ID,
+        'reconciledAt': datetime.utcnow().isoformat() + "Z"
+    })
+
+    logger.info("Reconciled %d facets over %d listings", len(counts), sum(counts.values()))
+    return {'statusCode': 200, 'body': json.dumps({'facets': len(counts), 'listings': sum(counts.values())})}
+
+def update_facets(facet_deltas):
+    """Apply the batch's net count changes to the facets item in a single ADD."""
+    facet_deltas = {facet: delta for facet, delta in facet_deltas.items() if delta}
+    if not facet_deltas:
+        return
+
+    names = {}
+    values = {}
+    clauses = []
+    for index, (facet, delta) in enumerate(facet_deltas.items()):
+        names[f"#f{index}"] = facet
+        values[f":d{index}"] = delta
+        clauses.append(f"#f{index} :d{index}")
+
+    dynamodb.Table(DYNAMODB_AGGREGATES_TABLE).update_item(
+        Key={'aggregateID': FACETS_AGGREGATE_ID},
+        UpdateExpression="ADD " + ", ".join(clauses),
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues=values
+    )
+
+def bid_activity(old_listing, new_listing):
+    """What one listing change means for the hot-auctions board, or None when nothing.
+
+    Returns (listingID, bids, summary) where bids is [(epoch seconds, weight)]
+    for the bids the change added, and a None summary takes the auction off
+    the board because it stopped being available.
+    """
+    listing = new_listing or old_listing
+    if (listing.get('type') or '').lower() != 'auction':
+        return None
+    if (new_listing or {}).get('status') != 'available':
+        if old_listing.get('status') == 'available':
+            return (listing['listingID'], [], None)
+        return None
+
+    old_bids = old_listing.get('bids') or []
+    new_bids = new_listing.get('bids') or []
+    added = len(new_bids) - len(old_bids)
+    if added <= 0:
+        return None
+
+    # New bids are inserted at the front; weigh them oldest first against the price they beat.
+    previous = old_bids[0]['amount'] if old_bids else None
+    bids = []
+    for bid in reversed(new_bids[:added]):
+        growth = float((bid['amount'] - previous) / previous) if previous else 0
+        bids.append((bid_timestamp(bid), 1 + PRICE_GROWTH_WEIGHT * max(growth, 0)))
+        previous = bid['amount']
+
+    summary = {
+        'name': new_listing.get('name', ''),
+        'price': new_bids[0]['amount'],
+        'bidCount': len(new_bids),
+        'endDate': new_listing.get('endDate', '')
+    }
+    return (new_listing['listingID'], bids, summary)
+
+def bid_timestamp(bid):
+    try:
+        return datetime.strptime(bid['time'], "%Y-%m-%dT%H:%M:%S.%fZ").replace(tzinfo=timezone.utc).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return time.time()
+
+def update_hot_auctions(activity):
+    """Fold the batch's bids into the hot-auctions item with one conditional read-modify-write."""
+    if not activity:
+        return
+
+    aggregates_table = dynamodb.Table(DYNAMODB_AGGREGATES_TABLE)
+    for attempt in range(HOT_UPDATE_ATTEMPTS):
+        item = aggregates_table.get_item(Key={'aggregateID': HOT_AUCTIONS_AGGREGATE_ID}, ConsistentRead=True).get('Item')
+        board = merge_hot_auctions(item or {}, activity, time.time())
+        # Shards of the stream are processed concurrently; the version guards against lost updates.
+        if item:
+            condition = {'ConditionExpression': "version = :version", 'ExpressionAttributeValues': {':version': item['version']}}
+        else:
+            condition = {'ConditionExpression': "attribute_not_exists(aggregateID)"}
+        try:
+            aggregates_table.put_item(Item=board, **condition)
+            return
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            logger.info("Hot-auctions board changed concurrently, retrying (attempt %d)", attempt + 1)
+
+    logger.error("Dropped the bid activity of %d listings after %d conflicting board updates", len(activity), HOT_UPDATE_ATTEMPTS)
+
+def merge_hot_auctions(item, activity, now):
+    """Return the hot-auctions item with the activity applied, keeping at most HOT_CAPACITY auctions.
+
+    A bid at time t adds weight * e ** (HOT_DECAY_RATE * (t - landmark)), so
+    stored scores never need decaying: ranks only change through new bids and
+    readers scale by e ** (-HOT_DECAY_RATE * (now - landmark)).
+    """
+    landmark = float(item.get('landmark', now))
+    entries = {listing_id: {**entry, 'score': float(entry['score'])} for listing_id, entry in item.get('entries', {}).items()}
+
+    if HOT_DECAY_RATE * (now - landmark) > HOT_REBASE_EXPONENT:
+        factor = math.exp(-HOT_DECAY_RATE * (now - landmark))
+        for entry in entries.values():
+            entry['score'] *= factor
+        landmark = now
+
+    for listing_id, bids, summary in activity:
+        if summary is None:
+            entries.pop(listing_id, None)
+            continue
+        added = sum(weight * math.exp(HOT_DECAY_RATE * (timestamp - landmark)) for timestamp, weight in bids)
+        entry = entries.get(listing_id)
+        if entry is None:
+            if len(entries) >= HOT_CAPACITY:
+                weakest = min(entries, key=lambda key: entries[key]['score'])
+                if entries[weakest]['score'] >= added:
+                    continue
+                del entries[weakest]
+            entry = entries[listing_id] = {'score': 0.0}
+        entry.update(summary)
+        entry['score'] += added
+
+    return {
+        'aggregateID': HOT_AUCTIONS_AGGREGATE_ID,
+        'landmark': Decimal(str(round(landmark, 3))),
+        'version': int(item.get('version', 0)) + 1,
+        'updatedAt': datetime.utcnow().isoformat() + "Z",
+        'entries': {listing_id: {**entry, 'score': Decimal(f"{entry['score']:.6g}")} for listing_id, entry in entries.items()}
+    }
+
+def listing_facet(listing):
+    """Counter attribute name for the listing's type, category and status."""
+    if not listing:
+        return None
+    return f"{listing.get('type') or 'unknown'}#{listing.get('category') or 'uncategorized'}#{listing.get('status') or 'unknown'}"
+
+def deserialize(image):
+    return {name: deserializer.deserialize(value) for name, value in image.items()}
+
+def listing_postings(listing):
+    """Map (term, rank) keys to the index items of one listing; empty when it should not be searchable."""
+    if not listing or listing.get('status') not in SEARCHABLE_STATUSES:
+        return {}
+
+    postings = {}
+    for term, score in term_scores(listing).items():
+        # Zero-padded score first so a term's postings read back best match first.
+        rank = f"{score:04d}#{listing['listingID']}"
+        postings[(term, rank)] = {
+            'term': term,
+            'rank': rank,
+            'listingID': listing['listingID'],
+            'score': score,
+            'type': listing.get('type', '')
+        }
+    return postings
+
+def term_scores(listing):
+    """Score every edge n-gram of the listing's tokens; whole words count double."""
+    scores = {}
+    for field, weight in FIELD_WEIGHTS.items():
+        tokens = tokenize(listing.get(field) or '')
+        if field == 'description':
+            tokens = tokens[:MAX_DESCRIPTION_TOKENS]
+        for token in tokens:
+            token = token[:MAX_PREFIX_LENGTH]
+            for length in range(MIN_PREFIX_LENGTH, len(token) + 1):
+                prefix = token[:length]
+                scores[prefix] = scores.get(prefix, 0) + (weight * 2 if prefix == token else weight)
+    return scores
+
+def tokenize(text):
+    """Lowercase, fold diacritics (ă â î ș ț and the cedilla forms) and drop stopwords."""
+    folded = unicodedata.normalize('NFKD', text.lower())
+    folded = ''.join(char for char in folded if not unicodedata.combining(char))
+    return [token for token in TOKEN_PATTERN.findall(folded) if len(token) >= MIN_PREFIX_LENGTH and token not in STOPWORDS]
@@ -0,0 +1,85 @@
+import json
+import boto3
+from botocore.exceptions import ClientError
+import logging
+import os
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+dynamodb = boto3.resource('dynamodb')
+
+DYNAMODB_USER_TABLE = os.environ['DYNAMODB_USER_TABLE']
+DYNAMODB_CONNECTION_TABLE = os.environ['DYNAMODB_CONNECTION_TABLE']
+ENDPOINT_URL = os.environ['ENDPOINT_URL']
+api_client = boto3.client('apigatewaymanagementapi', endpoint_url=ENDPOINT_URL)
+
+def lambda_handler(event, context):
+    """Drain the notifications queue, appending each user's notifications with one write per batch.
+
+    Messages are {"userEmail": ..., "notification": {...}} as queued by the
+    handlers' enqueue_notifications. Once stored, the notifications are pushed
+    to the user's open WebSocket connections. Only the messages of users whose
+    write failed are reported back to SQS for retry.
+    """
+    records = event.get('Records', [])
+    pending = {}
+    for record in records:
+        try:
+            message = json.loads(record['body'])
+            user_email = message['userEmail']
+            notification = message['notification']
+        except (ValueError, KeyError, TypeError) as e:
+            logger.error("Dropping malformed notification %s: %s", record.get('messageId'), str(e))
+            continue
+        entry = pending.setdefault(user_email, {'notifications': [], 'messageIDs': []})
+        entry['notifications'].append(notification)
+        entry['messageIDs'].append(record['messageId'])
+
+    users_table = dynamodb.Table(DYNAMODB_USER_TABLE)
+    failures = []
+    for user_email, entry in pending.items():
+        try:
+            users_table.update_item(
+                Key={'userEmail': user_email},
+                UpdateExpression="SET notifications = list_append(if_not_exists(notifications, :empty_list), :l)",
+                ConditionExpression="attribute_exists(userEmail)",
+                ExpressionAttributeValues={":l": entry['notifications'], ":empty_list": []}
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                logger.warning("Dropping %d notifications for missing user %s", len(entry['notifications']), user_email)
+                continue
+            logger.error("Failed to write notifications for %s: %s", user_email, str(e))
+            failures.extend(entry['messageIDs'])
+            continue
+
+        push_to_user(user_email, entry['notifications'])
+
+    logger.info("Processed %d notification messages for %d users, %d to retry",
+                len(records), len(pending), len(failures))
+    return {'batchItemFailures': [{'itemIdentifier': message_id} for message_id in failures]}
+
+def push_to_user(user_email, notifications):
+    """Send notifications to every live connection of the user, dropping connections that are gone."""
+    connections_table = dynamodb.Table(DYNAMODB_CONNECTION_TABLE)
+    try:
+        response = connections_table.query(
+            IndexName='userEmail-index',
+            KeyConditionExpression='userEmail = :email',
+            ExpressionAttributeValues={':email': user_email},
+            ProjectionExpression='connectionID'
+        )
+    except ClientError as e:
+        logger.error("Failed to look up connections of %s: %s", user_email, str(e))
+        return
+
+    data = json.dumps({"message": "New notifications", "notifications": notifications}, default=str)
+    for connection in response['Items']:
+        try:
+            api_client.post_to_connection(ConnectionId=connection['connectionID'], Data=data)
+        except api_client.exceptions.GoneException:
+            connections_table.delete_item(Key={'connectionID': connection['connectionID']})
+        except Exception as e:
+            # The notifications are already stored; clients still see them on their next fetch.
+            logger.error("Failed to push to %s: %s", connection['connectionID'], str(e))
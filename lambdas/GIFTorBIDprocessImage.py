@@ -0,0 +1,151 @@
+import json
+import boto3
+from botocore.exceptions import ClientError
+import hashlib
+import io
+import logging
+import os
+import re
+import urllib.parse
+from PIL import Image, ImageOps
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+s3 = boto3.client('s3')
+dynamodb = boto3.resource('dynamodb')
+
+S3_BUCKET = os.environ['S3_BUCKET']
+DYNAMODB_LISTING_TABLE = os.environ['DYNAMODB_LISTING_TABLE']
+
+SOURCE_PREFIXES = ('donations/', 'auctions/')
+SOURCE_FORMATS = ['JPEG', 'PNG', 'WEBP', 'MPO']
+MAX_IMAGE_PIXELS = 50_000_000
+CONTENT_HASH_PATTERN = re.compile(r'[0-9a-f]{64}')
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+IMAGE_VARIANTS = {
+    'thumbnail': {'size': (320, 320), 'crop': True, 'format': 'WEBP', 'extension': 'webp', 'contentType': 'image/webp', 'quality': 75},
+    'card': {'size': (640, 480), 'crop': True, 'format': 'WEBP', 'extension': 'webp', 'contentType': 'image/webp', 'quality': 80},
+    'full': {'size': (1600, 1600), 'crop': False, 'format': 'JPEG', 'extension': 'jpg', 'contentType': 'image/jpeg', 'quality': 85},
+}
+
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+def lambda_handler(event, context):
+    records = event.get('Records', [])
+    processed = 0
+
+    for record in records:
+        key = urllib.parse.unquote_plus(record['s3']['object']['key'])
+        if not key.startswith(SOURCE_PREFIXES):
+            logger.info("Skipping object outside listing folders: %s", key)
+            continue
+        try:
+            process_image(key)
+            processed += 1
+        except Exception as e:
+            logger.error("Failed to process image %s: %s", key, str(e))
+
+    return {
+        'statusCode': 200,
+        'body': json.dumps(f"Processed {processed} of {len(records)} images.")
+    }
+
+def process_image(key):
+    """Generate the thumbnail, card and full variants of an uploaded listing image."""
+    source = s3.get_object(Bucket=S3_BUCKET, Key=key)
+    data = source['Body'].read()
+
+    # Content-addressed keys end in the SHA-256 of the bytes; drop uploads that do not match it.
+    expected_digest = os.path.splitext(os.path.basename(key))[0]
+    if CONTENT_HASH_PATTERN.fullmatch(expected_digest) and hashlib.sha256(data).hexdigest() != expected_digest:
+        logger.error("Content of %s does not match its key, deleting it", key)
+        s3.delete_object(Bucket=S3_BUCKET, Key=key)
+        return
+
+    image = Image.open(io.BytesIO(data))
+
+    if image.format not in SOURCE_FORMATS:
+        logger.error("Unsupported image format %s for %s", image.format, key)
+        return
+
+    logger.info("Processing %s image %s (%dx%d)", image.format, key, image.width, image.height)
+
+    # Applying the EXIF orientation and re-encoding without passing exif= drops the metadata.
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+    for name, variant in IMAGE_VARIANTS.items():
+        if variant['crop']:
+            resized = ImageOps.fit(image, variant['size'], Image.LANCZOS)
+        else:
+            resized = image.copy()
+            resized.thumbnail(variant['size'], Image.LANCZOS)
+
+        if variant['format'] == 'JPEG' and resized.mode == 'RGBA':
+            background = Image.new('RGB', resized.size, (255, 255, 255))
+            background.paste(resized, mask=resized.getchannel('A'))
+            resized = background
+
+        buffer = io.BytesIO()
+        resized.save(buffer, format=variant['format'], quality=variant['quality'])
+
+        variant_key = f"variants/{key}/{name}.{variant['extension']}"
+        s3.put_object(
+            Bucket=S3_BUCKET,
+            Key=variant_key,
+            Body=buffer.getvalue(),
+            ContentType=variant['contentType'],
+            CacheControl=IMMUTABLE_CACHE_CONTROL
+        )
+        logger.info("Stored %s variant %s (%d bytes)", name, variant_key, buffer.tell())
+
+    record_variants(key)
+
+def record_variants(key):
+    """Point the listing at the variants of one of its images, now that all of them are stored.
+
+    Only images already on the listing are recorded; createListing and
+    updateListing pick up variants that finished before the listing named them.
+    """
+    parts = key.split('/')
+    if len(parts) != 3:
+        logger.info("Not recording variants of %s, its key does not name a listing", key)
+        return
+    url = f"https://{S3_BUCKET}.s3.amazonaws.com/{key}"
+    variants = {
+        name: f"https://{S3_BUCKET}.s3.amazonaws.com/variants/{key}/{name}.{variant['extension']}"
+        for name, variant in IMAGE_VARIANTS.items()
+    }
+
+    listing_table = dynamodb.Table(DYNAMODB_LISTING_TABLE)
+    attempts = [
+        # Add this image's entry to the imageVariants map...
+        ("SET imageVariants.#url = :variants", "contains(images, :url) AND attribute_type(imageVariants, :map)",
+         {':variants': variants}),
+        # ...or start the map when there is none yet, or only the old list form.
+        ("SET imageVariants = :all", "contains(images, :url) AND NOT attribute_type(imageVariants, :map)",
+         {':all': {url: variants}}),
+        # Another image of the listing may have started the map in between.
+        ("SET imageVariants.#url = :variants", "contains(images, :url) AND attribute_type(imageVariants, :map)",
+         {':variants': variants}),
+    ]
+    for update_expression, condition, values in attempts:
+        update_kwargs = {
+            'Key': {'listingID': parts[1]},
+            'UpdateExpression': update_expression,
+            'ConditionExpression': condition,
+            'ExpressionAttributeValues': {**values, ':url': url, ':map': 'M'}
+        }
+        if '#url' in update_expression:
+            update_kwargs['ExpressionAttributeNames'] = {'#url': url}
+        try:
+            listing_table.update_item(**update_kwargs)
+            logger.info("Recorded variants of %s on listing %s", key, parts[1])
+            return
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+    logger.info("Listing %s does not show %s yet, leaving its variants for the listing handlers", parts[1], key)
@@ -6,6 +6,8 @@ from datetime import datetime, timedelta
 import logging
 import random
 import os
+from giftorbid_common.storage import batch_get_items
+from giftorbid_common.notifications import enqueue_notifications
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -35,15 +37,22 @@ def lambda_handler(event, context):
             return {"statusCode": 400, "body": json.dumps({"error": "Missing required parameters"})}
 
         user_table = dynamodb.Table(DYNAMODB_USER_TABLE)
-        redeemer_user_response = user_table.get_item(Key={'userEmail': redeemer_email})
-        if 'Item' not in redeemer_user_response:
+        items = batch_get_items({
+            DYNAMODB_USER_TABLE: {
+                'Keys': [{'userEmail': email} for email in dict.fromkeys([redeemer_email, seller_email])],
+                'ProjectionExpression': "userEmail, userID, listingsIDs"
+            },
+            DYNAMODB_LISTING_TABLE: {'Keys': [{'listingID': listing_id}]}
+        })
+        users = {user['userEmail']: user for user in items[DYNAMODB_USER_TABLE]}
+
+        if redeemer_email not in users:
             return {"statusCode": 404, "body": json.dumps({"error": "Redeemer not found"})}
-        redeemer_user_item = redeemer_user_response['Item']
+        redeemer_user_item = users[redeemer_email]
 
-        seller_user_response = user_table.get_item(Key={'userEmail': seller_email})
-        if 'Item' not in seller_user_response:
+        if seller_email not in users:
             return {"statusCode": 404, "body": json.dumps({"error": "Seller not found"})}
-        seller_user_item = seller_user_response['Item']
+        seller_user_item = users[seller_email]
 
         if seller_user_item['userID'] != sub:
             return {"statusCode": 403, "body": json.dumps({"error": "Unauthorized"})}
@@ -52,10 +61,9 @@ def lambda_handler(event, context):
             return {"statusCode": 404, "body": json.dumps({"error": "Listing not found or unauthorized"})}
 
         listing_table = dynamodb.Table(DYNAMODB_LISTING_TABLE)
-        listing_response = listing_table.get_item(Key={'listingID': listing_id})
-        if 'Item' not in listing_response:
+        if not items[DYNAMODB_LISTING_TABLE]:
             return {"statusCode": 404, "body": json.dumps({"error": "Listing not found"})}
-        listing_item = listing_response['Item']
+        listing_item = items[DYNAMODB_LISTING_TABLE][0]
 
         if listing_item['status'] in ['ordered', 'redeemed']:
             if listing_item['status'] == 'ordered':
@@ -63,13 +71,11 @@ def lambda_handler(event, context):
                 order_id = f"order-{listing_id}"
                 orders_table.delete_item(Key={'orderID': order_id})
 
-            if listing_id in redeemer_user_item.get('redeemedIDs', []):
-                redeemer_user_item['redeemedIDs'].remove(listing_id)
-                user_table.update_item(
-                    Key={'userEmail': redeemer_email},
-                    UpdateExpression="SET redeemedIDs = :r",
-                    ExpressionAttributeValues={":r": redeemer_user_item['redeemedIDs']}
-                )
+            user_table.update_item(
+                Key={'userEmail': redeemer_email},
+                UpdateExpression="DELETE redeemedIDs :r",
+                ExpressionAttributeValues={":r": {listing_id}}
+            )
 
             now = datetime.utcnow().isoformat() + "Z"
 
@@ -96,11 +102,7 @@ def lambda_handler(event, context):
                 'message': f"The seller refused your redemption for listing '{listing_item['name']}' due to low rating.",
                 'redirect': '/auctions' if listing_item['type'] == 'auction' else '/donations'
             }
-            user_table.update_item(
-                Key={'userEmail': redeemer_email},
-                UpdateExpression="SET notifications = list_append(if_not_exists(notifications, :empty_list), :n)",
-                ExpressionAttributeValues={":n": [notification], ":empty_list": []}
-            )
+            enqueue_notifications([(redeemer_email, notification)])
 
             return {"statusCode": 200, "body": json.dumps({"message": "Redemption cancelled and listing reset"})}
 
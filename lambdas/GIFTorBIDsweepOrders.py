@@ -0,0 +1,144 @@
+import json
+import boto3
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+from datetime import datetime, timedelta
+import logging
+import os
+from giftorbid_common.storage import batch_get_items
+from giftorbid_common.notifications import enqueue_notifications
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+dynamodb = boto3.resource('dynamodb')
+
+DYNAMODB_ORDERS_TABLE = os.environ['DYNAMODB_ORDERS_TABLE']
+DYNAMODB_LISTING_TABLE = os.environ['DYNAMODB_LISTING_TABLE']
+
+SWEEP_INDEX = 'sweep-index'
+# Days of sweepDay partitions re-checked each run, so a missed schedule is caught up.
+LOOKBACK_DAYS = 7
+# After an order becomes reviewable the parties get this long before the listing is closed anyway.
+COMPLETE_AFTER_DAYS = 14
+PAGE_SIZE = 100
+# Stop with this much invocation time left; unswept orders stay in the index for the next run.
+MIN_REMAINING_TIME_MS = 30000
+
+def lambda_handler(event, context):
+    """Move due orders forward using the sparse sweep-index (sweepDay, sweepAt).
+
+    Stage "reviewable": at expirationDate both parties are told they can review.
+    Stage "complete": COMPLETE_AFTER_DAYS later a listing still "ordered" is closed
+    and the order leaves the index.
+    """
+    now = datetime.utcnow()
+    now_iso = now.isoformat() + "Z"
+    orders_table = dynamodb.Table(DYNAMODB_ORDERS_TABLE)
+
+    swept = {'reviewable': 0, 'complete': 0, 'skipped': 0}
+    out_of_time = False
+    for days_back in range(LOOKBACK_DAYS, -1, -1):
+        sweep_day = (now - timedelta(days=days_back)).strftime("%Y-%m-%d")
+        query_kwargs = {
+            'IndexName': SWEEP_INDEX,
+            'KeyConditionExpression': Key('sweepDay').eq(sweep_day) & Key('sweepAt').lte(now_iso),
+            'Limit': PAGE_SIZE
+        }
+
+        while True:
+            if context.get_remaining_time_in_millis() < MIN_REMAINING_TIME_MS:
+                out_of_time = True
+                break
+
+            response = orders_table.query(**query_kwargs)
+            if response['Items']:
+                sweep_orders(response['Items'], now, swept)
+
+            if 'LastEvaluatedKey' not in response:
+                break
+            query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+        if out_of_time:
+            logger.info("Stopping at the time budget in sweepDay %s", sweep_day)
+            break
+
+    logger.info("Swept orders: %s", swept)
+    return {
+        'statusCode': 200,
+        'body': json.dumps({**swept, 'finished': not out_of_time})
+    }
+
+def sweep_orders(orders, now, swept):
+    """Advance one page of due orders, then queue the parties' notifications."""
+    orders_table = dynamodb.Table(DYNAMODB_ORDERS_TABLE)
+    listings_table = dynamodb.Table(DYNAMODB_LISTING_TABLE)
+
+    listing_ids = list(dict.fromkeys(order['listingID'] for order in orders))
+    items = batch_get_items({
+        DYNAMODB_LISTING_TABLE: {
+            'Keys': [{'listingID': listing_id} for listing_id in listing_ids],
+            'ProjectionExpression': 'listingID, #name',
+            'ExpressionAttributeNames': {'#name': 'name'}
+        }
+    })
+    names = {listing['listingID']: listing['name'] for listing in items[DYNAMODB_LISTING_TABLE]}
+
+    notifications = []
+    for order in orders:
+        stage = order.get('sweepStage', 'reviewable')
+        try:
+            if stage == 'reviewable':
+                complete_at = now + timedelta(days=COMPLETE_AFTER_DAYS)
+                # Conditioned on the sweepAt we read, so overlapping runs advance an order only once.
+                orders_table.update_item(
+                    Key={'orderID': order['orderID']},
+                    UpdateExpression="SET sweepStage = :stage, sweepDay = :day, sweepAt = :at",
+                    ConditionExpression="sweepAt = :expected",
+                    ExpressionAttributeValues={
+                        ':stage': 'complete',
+                        ':day': complete_at.strftime("%Y-%m-%d"),
+                        ':at': complete_at.isoformat() + "Z",
+                        ':expected': order['sweepAt']
+                    }
+                )
+                name = names.get(order['listingID'], order['listingID'])
+                notifications.append((order['sellerEmail'], {
+                    'message': f"Your order for '{name}' has ended, you can now review the redeemer.",
+                    'redirect': '/posts'
+                }))
+                notifications.append((order['redeemerEmail'], {
+                    'message': f"Your order for '{name}' has ended, you can now review the seller.",
+                    'redirect': '/aquisitions'
+                }))
+                swept['reviewable'] += 1
+            else:
+                orders_table.update_item(
+                    Key={'orderID': order['orderID']},
+                    UpdateExpression="REMOVE sweepStage, sweepDay, sweepAt",
+                    ConditionExpression="sweepAt = :expected",
+                    ExpressionAttributeValues={':expected': order['sweepAt']}
+                )
+                close_listing(listings_table, order['listingID'])
+                swept['complete'] += 1
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            logger.info("Order %s was already swept", order['orderID'])
+            swept['skipped'] += 1
+
+    enqueue_notifications(notifications)
+
+def close_listing(listings_table, listing_id):
+    """Mark the listing complete unless both reviews already did, or it moved on."""
+    try:
+        listings_table.update_item(
+            Key={'listingID': listing_id},
+            UpdateExpression="SET #status = :complete",
+            ConditionExpression="#status = :ordered",
+            ExpressionAttributeNames={"#status": "status"},
+            ExpressionAttributeValues={":complete": "complete", ":ordered": "ordered"}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
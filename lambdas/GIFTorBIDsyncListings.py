@@ -2,6 +2,7 @@ import json
 import logging
 import boto3
 import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -10,21 +11,35 @@ dynamodb = boto3.resource('dynamodb')
 DYNAMODB_WEBSOCKET_TABLE = os.environ['DYNAMODB_WEBSOCKET_TABLE']
 ENDPOINT_URL = os.environ['ENDPOINT_URL']
 api_client = boto3.client('apigatewaymanagementapi', endpoint_url=ENDPOINT_URL)
+lambda_client = boto3.client('lambda')
+
+# Connection-table scan segments, each broadcast by its own worker invocation.
+BROADCAST_SEGMENTS = int(os.environ.get('BROADCAST_SEGMENTS', '1'))
+# "invoke" fans segments out to invocations of this function; "local" uses a process pool (tests, local runs).
+BROADCAST_MODE = os.environ.get('BROADCAST_MODE', 'invoke')
+MAX_SEND_WORKERS = 32
 
 def lambda_handler(event, context):
+    if 'broadcast' in event:
+        broadcast = event['broadcast']
+        return broadcast_segment(broadcast['messages'], broadcast['segment'], broadcast['totalSegments'])
+
     logger.info("Received event: %s", json.dumps(event))
     records = event.get('Records', [])
 
+    messages = []
     for record in records:
         if record['eventName'] in ['INSERT', 'MODIFY']:
             new_image = record['dynamodb'].get('NewImage', {})
             old_image = record['dynamodb'].get('OldImage', {})
             listing_id = new_image.get('listingID', {})
             listing_type = new_image.get('type', {})
-            new_status = new_image.get('status', {})
-            old_status = old_image.get('status', {})
             if has_significant_change(new_image, old_image):
-                    notify_clients(listing_id.get('S', ''), listing_type.get('S', ''))
+                messages.append({"message": "Updade for listing", "listing": listing_id.get('S', ''), "type": listing_type.get('S', '')})
+
+    if messages:
+        totals = notify_clients(messages, context)
+        logger.info("Broadcast %d listing updates: %s", len(messages), totals)
 
 def has_significant_change(new_image, old_image):
     new_status = new_image.get('status', {}).get('S')
@@ -40,22 +55,69 @@ def has_significant_change(new_image, old_image):
 
     return False
 
-def get_all_connection_ids():
+def notify_clients(messages, context):
+    """Scatter the broadcast over the connection-table segments and gather the delivery counts."""
+    if BROADCAST_SEGMENTS <= 1:
+        return broadcast_segment(messages, 0, 1)
+
+    segments = range(BROADCAST_SEGMENTS)
+    if BROADCAST_MODE == 'local':
+        with ProcessPoolExecutor(max_workers=BROADCAST_SEGMENTS) as executor:
+            results = list(executor.map(broadcast_segment, [messages] * BROADCAST_SEGMENTS, segments, [BROADCAST_SEGMENTS] * BROADCAST_SEGMENTS))
+    else:
+        with ThreadPoolExecutor(max_workers=BROADCAST_SEGMENTS) as executor:
+            results = list(executor.map(lambda segment: invoke_segment(context.function_name, messages, segment), segments))
+
+    totals = {'connections': 0, 'delivered': 0, 'gone': 0, 'failed': 0, 'failedSegments': 0}
+    for result in results:
+        for key in totals:
+            totals[key] += result.get(key, 0)
+    return totals
+
+def invoke_segment(function_name, messages, segment):
+    """Run one segment's broadcast in a separate invocation of this function and return its counts."""
+    try:
+        response = lambda_client.invoke(
+            FunctionName=function_name,
+            InvocationType='RequestResponse',
+            Payload=json.dumps({'broadcast': {'messages': messages, 'segment': segment, 'totalSegments': BROADCAST_SEGMENTS}})
+        )
+        if 'FunctionError' in response:
+            raise RuntimeError(response['Payload'].read().decode())
+        return json.loads(response['Payload'].read())
+    except Exception as e:
+        logger.error("Broadcast worker for segment %d failed: %s", segment, str(e))
+        return {'failedSegments': 1}
+
+def broadcast_segment(messages, segment, total_segments):
+    """Send every message to the connections in one scan segment, several connections at a time."""
     connections_table = dynamodb.Table(DYNAMODB_WEBSOCKET_TABLE)
-    connection_ids = []
-    response = connections_table.scan(ProjectionExpression='connectionID')
-    for item in response['Items']:
-        connection_ids.append(item['connectionID'])
-    return connection_ids
-
-def notify_clients(listing_id, listing_type):
-    connection_ids = get_all_connection_ids()
-    for connection_id in connection_ids:
-        send_message_to_client(connection_id, listing_id, listing_type)
-
-def send_message_to_client(connection_id, listing_id, listing_type):
+    scan_kwargs = {'ProjectionExpression': 'connectionID', 'Segment': segment, 'TotalSegments': total_segments}
+
+    counts = {'connections': 0, 'delivered': 0, 'gone': 0, 'failed': 0}
+    with ThreadPoolExecutor(max_workers=MAX_SEND_WORKERS) as executor:
+        while True:
+            response = connections_table.scan(**scan_kwargs)
+            connection_ids = [item['connectionID'] for item in response['Items']]
+            counts['connections'] += len(connection_ids)
+            for result in executor.map(lambda connection_id: send_messages_to_client(connection_id, messages), connection_ids):
+                counts[result] += 1
+            if 'LastEvaluatedKey' not in response:
+                break
+            scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    logger.info("Segment %d/%d broadcast: %s", segment, total_segments, counts)
+    return counts
+
+def send_messages_to_client(connection_id, messages):
     try:
-        api_client.post_to_connection(ConnectionId=connection_id, Data=json.dumps({"message": "Updade for listing", "listing": listing_id, "type": listing_type }))
+        for message in messages:
+            api_client.post_to_connection(ConnectionId=connection_id, Data=json.dumps(message))
+        return 'delivered'
+    except api_client.exceptions.GoneException:
+        # The client is thread-safe, unlike Table resources.
+        dynamodb.meta.client.delete_item(TableName=DYNAMODB_WEBSOCKET_TABLE, Key={'connectionID': connection_id})
+        return 'gone'
     except Exception as e:
         logger.error("Failed to send message to %s: %s", connection_id, str(e))
-
+        return 'failed'
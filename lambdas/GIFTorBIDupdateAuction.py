@@ -4,8 +4,14 @@ import uuid
 import base64
 from datetime import datetime, timedelta
 import logging
+import math
+import time
 from decimal import Decimal
 import os
+from giftorbid_common.storage import batch_get_items
+from giftorbid_common.notifications import enqueue_notifications
+from giftorbid_common.idempotency import handle_idempotent
+from giftorbid_common.auth import authorized_email
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -17,7 +23,29 @@ DYNAMODB_USER_TABLE = os.environ['DYNAMODB_USER_TABLE']
 DYNAMODB_LISTING_TABLE = os.environ['DYNAMODB_LISTING_TABLE']
 S3_BUCKET = os.environ['S3_BUCKET']
 
+IDEMPOTENCY_SCOPE = 'updateAuction'
+
+# Admission control runs before any DynamoDB work, except the per-user limit of callers
+# without an authorizer identity, which waits for the ownership check. Its state lives in
+# this execution environment, so the limits apply per warm instance, not globally.
+USER_BID_RATE = float(os.environ.get('USER_BID_RATE', '1'))
+USER_BID_BURST = float(os.environ.get('USER_BID_BURST', '5'))
+LISTING_BID_RATE = float(os.environ.get('LISTING_BID_RATE', '20'))
+LISTING_BID_BURST = float(os.environ.get('LISTING_BID_BURST', '40'))
+# While an auction runs its highest bid only rises, so a cached one is a safe lower bound until
+# the endDate it was read with; only ended auctions are relisted with their bids reset.
+PRICE_CACHE_TTL_SECONDS = 30
+MAX_TRACKED_KEYS = 10000
+METRICS_NAMESPACE = 'GIFTorBID'
+
+user_buckets = {}
+listing_buckets = {}
+price_cache = {}
+
 def lambda_handler(event, context):
+    return handle_idempotent(IDEMPOTENCY_SCOPE, event, context, handle_request, admit=admit_bid)
+
+def handle_request(event, context):
     try:
         logger.info("Received event: %s", json.dumps(event))
 
@@ -36,30 +64,43 @@ def lambda_handler(event, context):
             logger.error("Missing required parameters: sub, bidderEmail, listingID, or name, bidAmount")
             return {"statusCode": 400, "body": json.dumps({"error": "Missing required parameters"})}
 
-        user_table = dynamodb.Table(DYNAMODB_USER_TABLE)
-        user_response = user_table.get_item(Key={'userEmail': bidder_email})
-
+        items = batch_get_items({
+            DYNAMODB_USER_TABLE: {
+                'Keys': [{'userEmail': bidder_email}],
+                'ProjectionExpression': "userID, #name",
+                'ExpressionAttributeNames': {"#name": "name"}
+            },
+            DYNAMODB_LISTING_TABLE: {'Keys': [{'listingID': listing_id}]}
+        })
 
-        if 'Item' not in user_response:
+        if not items[DYNAMODB_USER_TABLE]:
             logger.error(f"User not found: {bidder_email}")
             return {"statusCode": 404, "body": json.dumps({"error": "User not found"})}
 
-        user_item = user_response['Item']
-        if user_item['userID'] != sub or listing_id in user_item.get('listingsIDs', []):
+        user_item = items[DYNAMODB_USER_TABLE][0]
+        if user_item['userID'] != sub:
             logger.error("Unauthorized access or listing not found")
             return {"statusCode": 403, "body": json.dumps({"error": "Unauthorized access or listing not found"})}
 
+        # Without an authorizer identity the bidder is only known once sub matched their userID.
+        if not caller_email(event):
+            retry_after = take_token(user_buckets, bidder_email, USER_BID_RATE, USER_BID_BURST, time.monotonic())
+            if retry_after:
+                emit_admission_metric('ShedUserRate', listing_id)
+                return too_many_bids("Too many bids, slow down", retry_after)
+
         listing_table = dynamodb.Table(DYNAMODB_LISTING_TABLE)
-        listing_response = listing_table.get_item(Key={'listingID': listing_id})
 
-        if 'Item' not in listing_response:
+        if not items[DYNAMODB_LISTING_TABLE]:
             return {"statusCode": 404, "body": json.dumps({"error": "Listing not found"})}
+        listing_item = items[DYNAMODB_LISTING_TABLE][0]
 
-        if listing_response['Item'].get('sellerEmail') == bidder_email:
+        if listing_item.get('sellerEmail') == bidder_email:
             return {"statusCode": 403, "body": json.dumps({"error": "Cannot bid on your own listing"})}
 
-        current_bids = listing_response['Item'].get('bids', [])
+        current_bids = listing_item.get('bids', [])
         if len(current_bids) > 0:
+            remember_price(listing_id, current_bids[0]['amount'], listing_item.get('endDate', ''))
             logger.info("Current highest bid: %s, %s", current_bids[0]['bidderEmail'], current_bids[0]['amount'])
             if current_bids[0]['bidderEmail'] == bidder_email:
                 return {"statusCode": 403, "body": json.dumps({"error": "Cannot outbid your own last bid"})}
@@ -68,7 +109,7 @@ def lambda_handler(event, context):
                 return {"statusCode": 403, "body": json.dumps({"error": "Bid must be higher than the current highest bid"})}
 
         bid_date = datetime.utcnow().isoformat() + "Z"
-        current_endDate = listing_response['Item'].get('endDate', '')
+        current_endDate = listing_item.get('endDate', '')
 
         logger.info("Not over current end time passed: %s", current_endDate)
         logger.info("Bid date: %s", bid_date)
@@ -110,24 +151,106 @@ def lambda_handler(event, context):
             ExpressionAttributeValues={":b": current_bids},
             ReturnValues="UPDATED_NEW"
         )
+        remember_price(listing_id, bid_amount, current_endDate)
 
-        if len(current_bids) > 0:
+        if len(current_bids) > 1:
             previous_bidder = current_bids[1]['bidderEmail']
-            notification_message = f"Someone outbid you on listing '{listing_response['Item']['name']}'."
+            notification_message = f"Someone outbid you on listing '{listing_item['name']}'."
             route = f"/auction/{listing_id}"
             notification = { 
                 'message': notification_message, 
                 'redirect': route
             }
-            user_table = dynamodb.Table(DYNAMODB_USER_TABLE)
-            user_table.update_item(
-                Key={'userEmail': previous_bidder},
-                UpdateExpression="SET notifications = list_append(if_not_exists(notifications, :empty_list), :l)",
-                ExpressionAttributeValues={":l": [notification], ":empty_list": []}
-            )
+            enqueue_notifications([(previous_bidder, notification)])
 
         return {"statusCode": 200, "body": json.dumps({"message": "Bid successfully placed"})}
 
     except Exception as e:
         logger.error("Error: %s", str(e))
-        return {"statusCode": 500, "body": json.dumps({"error": str(e)})}
\ No newline at end of file
+        return {"statusCode": 500, "body": json.dumps({"error": str(e)})}
+
+def admit_bid(event):
+    """Shed a bid before any DynamoDB work when it is rate limited or cannot beat the cached price.
+
+    Returns the rejection response, or None to let the bid through. Malformed
+    bodies are let through for handle_request to answer.
+    """
+    try:
+        body = json.loads(event['body'])
+        listing_id = body['listingID']
+        bid_amount = Decimal(str(body['bidAmount']))
+    except Exception:
+        return None
+    now = time.monotonic()
+
+    # The body's sub and bidderEmail are unverified here; only an authorizer identity may charge a user's bucket.
+    user_email = caller_email(event)
+    if user_email:
+        retry_after = take_token(user_buckets, user_email, USER_BID_RATE, USER_BID_BURST, now)
+        if retry_after:
+            emit_admission_metric('ShedUserRate', listing_id)
+            return too_many_bids("Too many bids, slow down", retry_after)
+
+    cached = price_cache.get(listing_id)
+    if (cached and now - cached[2] < PRICE_CACHE_TTL_SECONDS and bid_amount <= cached[0]
+            and datetime.utcnow().isoformat() + "Z" < cached[1]):
+        emit_admission_metric('ShedPrice', listing_id)
+        return {"statusCode": 403, "body": json.dumps({"error": "Bid must be higher than the current highest bid"})}
+
+    retry_after = take_token(listing_buckets, listing_id, LISTING_BID_RATE, LISTING_BID_BURST, now)
+    if retry_after:
+        emit_admission_metric('ShedListingRate', listing_id)
+        return too_many_bids("This auction is receiving too many bids, try again shortly", retry_after)
+
+    emit_admission_metric('Admitted', listing_id)
+    return None
+
+def caller_email(event):
+    return authorized_email(event.get('requestContext', {}).get('authorizer') or {})
+
+def take_token(buckets, key, rate, burst, now):
+    """Take one token from the key's bucket; returns 0 on success, else the seconds until a token is available."""
+    tokens, updated_at = buckets.pop(key, (burst, now))
+    tokens = min(burst, tokens + (now - updated_at) * rate)
+    if tokens >= 1:
+        tokens -= 1
+        retry_after = 0
+    else:
+        retry_after = max(math.ceil((1 - tokens) / rate), 1)
+    # Re-inserted so the dict stays in least-recently-used order for eviction.
+    buckets[key] = (tokens, now)
+    if len(buckets) > MAX_TRACKED_KEYS:
+        del buckets[next(iter(buckets))]
+    return retry_after
+
+def remember_price(listing_id, amount, end_date):
+    """Cache the listing's highest bid together with the endDate it is valid until."""
+    price_cache.pop(listing_id, None)
+    price_cache[listing_id] = (amount, end_date, time.monotonic())
+    if len(price_cache) > MAX_TRACKED_KEYS:
+        del price_cache[next(iter(price_cache))]
+
+def too_many_bids(message, retry_after):
+    return {
+        "statusCode": 429,
+        "headers": {"Retry-After": str(retry_after)},
+        "body": json.dumps({"error": message})
+    }
+
+def emit_admission_metric(outcome, listing_id):
+    """Log one admission decision in CloudWatch embedded metric format."""
+    # Printed rather than logged: the Lambda log formatter's prefix would hide the JSON from CloudWatch.
+    print(json.dumps({
+        "_aws": {
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": METRICS_NAMESPACE,
+                "Dimensions": [["Function", "Outcome"]],
+                "Metrics": [{"Name": "BidAdmission", "Unit": "Count"}]
+            }]
+        },
+        "Function": "updateAuction",
+        "Outcome": outcome,
+        "BidAdmission": 1,
+        "listingID": listing_id
+    }))
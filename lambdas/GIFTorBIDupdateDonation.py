@@ -5,6 +5,8 @@ import base64
 from datetime import datetime, timedelta
 import logging
 import os
+from giftorbid_common.storage import batch_get_items
+from giftorbid_common.notifications import enqueue_notifications
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -34,27 +36,38 @@ def lambda_handler(event, context):
             return {"statusCode": 400, "body": json.dumps({"error": "Missing required parameters"})}
 
         user_table = dynamodb.Table(DYNAMODB_USER_TABLE)
-        user_response = user_table.get_item(Key={'userEmail': redeemer_email})
-
-        if 'Item' not in user_response:
+        items = batch_get_items({
+            DYNAMODB_USER_TABLE: {
+                'Keys': [{'userEmail': redeemer_email}],
+                'ProjectionExpression': "userID, #name",
+                'ExpressionAttributeNames': {"#name": "name"}
+            },
+            DYNAMODB_LISTING_TABLE: {
+                'Keys': [{'listingID': listing_id}],
+                'ProjectionExpression': "sellerEmail, #status",
+                'ExpressionAttributeNames': {"#status": "status"}
+            }
+        })
+
+        if not items[DYNAMODB_USER_TABLE]:
             logger.error(f"User not found: {redeemer_email}")
             return {"statusCode": 404, "body": json.dumps({"error": "User not found"})}
 
-        user_item = user_response['Item']
-        if user_item['userID'] != sub or listing_id in user_item.get('listingsIDs', []):
+        user_item = items[DYNAMODB_USER_TABLE][0]
+        if user_item['userID'] != sub:
             logger.error("Unauthorized access or listing not found")
             return {"statusCode": 403, "body": json.dumps({"error": "Unauthorized access or listing not found"})}
 
         listing_table = dynamodb.Table(DYNAMODB_LISTING_TABLE)
-        listing_response = listing_table.get_item(Key={'listingID': listing_id})
 
-        if 'Item' not in listing_response:
+        if not items[DYNAMODB_LISTING_TABLE]:
             return {"statusCode": 404, "body": json.dumps({"error": "Listing not found"})}
+        listing_item = items[DYNAMODB_LISTING_TABLE][0]
 
-        if listing_response['Item'].get('sellerEmail') == redeemer_email:
+        if listing_item.get('sellerEmail') == redeemer_email:
             return {"statusCode": 403, "body": json.dumps({"error": "Cannot redeem your own listing"})}
 
-        if listing_response['Item'].get('status') != 'available':
+        if listing_item.get('status') != 'available':
             return {"statusCode": 403, "body": json.dumps({"error": "Listing already redeemed"})}
 
         listing_date = datetime.utcnow().isoformat() + "Z"
@@ -70,36 +83,26 @@ def lambda_handler(event, context):
         
         logger.info("Listing updated successfully: %s", update_response)
 
+        update_redeemerUser = user_table.update_item(
+            Key={'userEmail': redeemer_email},
+            UpdateExpression="ADD redeemedIDs :l",
+            ExpressionAttributeValues={":l": {listing_id}},
+            ReturnValues="UPDATED_NEW"
+        )
+
+        logger.info("RedeemedIDs updated successfully: %s", update_redeemerUser)
+
         notification_message = f"User {user_item['name']} redeemed the listing '{listing_name}'."
         route = f"/donation/{listing_id}"
         notification = {
             'message': notification_message,
             'redirect': route,
         }
-        
-        update_sellerUser = user_table.update_item(
-            Key={'userEmail': seller_email},
-            UpdateExpression="SET notifications = list_append(if_not_exists(notifications, :empty_list), :l)",
-            ExpressionAttributeValues={":l": [notification], ":empty_list": []},
-            ReturnValues="UPDATED_NEW"
-        )
-
-        logger.info("Notifications updated successfully: %s", update_sellerUser)
-
-        update_redeemerUser = user_table.update_item(
-            Key={'userEmail': redeemer_email},
-            UpdateExpression="SET redeemedIDs = list_append(if_not_exists(redeemedIDs, :empty_list), :l)",
-            ExpressionAttributeValues={":l": [listing_id], ":empty_list": []},
-            ReturnValues="UPDATED_NEW"
-        )
 
-        logger.info("Notifications updated successfully: %s", update_redeemerUser)
+        enqueue_notifications([(seller_email, notification)])
 
         return {"statusCode": 200, "body": json.dumps({"message": "Donation redeemed successfully"})}
 
     except Exception as e:
         logger.error("Error: %s", str(e))
         return {"statusCode": 500, "body": json.dumps({"error": str(e)})}
-
-
-
@@ -1,10 +1,11 @@
 import json
 import boto3
+from botocore.exceptions import ClientError
 import uuid
-import base64
 from datetime import datetime, timedelta
 import logging
 import os
+from giftorbid_common.images import IMAGE_VARIANT_EXTENSIONS, verify_uploaded_images, store_images, generated_variants, record_late_variants
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -16,9 +17,11 @@ DYNAMODB_USER_TABLE = os.environ['DYNAMODB_USER_TABLE']
 DYNAMODB_LISTING_TABLE = os.environ['DYNAMODB_LISTING_TABLE']
 S3_BUCKET = os.environ['S3_BUCKET']
 
+DELETE_BATCH_SIZE = 1000
+
 def lambda_handler(event, context):
     try:
-        logger.info("Received event: %s", json.dumps(event))
+        logger.info("Received event: %s", json.dumps({key: value for key, value in event.items() if key != 'body'}))
 
         if 'body' not in event:
             logger.error("Missing 'body' in the event")
@@ -51,9 +54,17 @@ def lambda_handler(event, context):
 
         logger.info("Listing found: %s", listing_response['Item'].get('images', []))
         if 'images' in body and body['images']:
-            delete_images(listing_response['Item'].get('images', []))
-            new_image_urls = upload_new_images(body['images'], listing_id, listing_response['Item'].get('type'))
-            update_listing(listing_id, body, listing_table, new_image_urls)
+            current_images = listing_response['Item'].get('images', [])
+            upload_error = verify_uploaded_images(body['images'], listing_id, listing_response['Item'].get('type'), current_images)
+            if upload_error:
+                logger.error(upload_error)
+                return {"statusCode": 400, "body": json.dumps({"error": upload_error})}
+
+            new_image_urls = store_images(body['images'], listing_id, listing_response['Item'].get('type'), current_images)
+            variants = generated_variants(new_image_urls, listing_response['Item'].get('imageVariants'))
+            update_listing(listing_id, body, listing_table, new_image_urls, variants)
+            record_late_variants(listing_table, listing_id, new_image_urls, variants)
+            delete_images([url for url in current_images if url not in new_image_urls])
         else:
             update_listing(listing_id, body, listing_table, listing_response['Item'].get('images', []))
 
@@ -64,22 +75,26 @@ def lambda_handler(event, context):
         return {"statusCode": 500, "body": json.dumps({"error": str(e)})}
 
 def delete_images(image_urls):
+    """Delete images from S3 in batches, returning the keys that could not be deleted."""
+    keys = []
     for url in image_urls:
         key = '/'.join(url.split("https://")[1].split("/")[1:])
-        s3.delete_object(Bucket=S3_BUCKET, Key=key)
-        logger.info(f"Deleted image: {key}, with the url: {url}")
-
-def upload_new_images(images, object_id, type):
-    folder = "donations" if type.lower() == "donation" else "auctions"
-    image_urls = []
-    for index, image in enumerate(images):
-        image_data = base64.b64decode(image.split(",")[1])
-        s3_key = f"{folder}/{object_id}-{index + 1}.jpg"
-        s3.put_object(Bucket=S3_BUCKET, Key=s3_key, Body=image_data, ContentType="image/jpeg")
-        image_urls.append(f"https://{S3_BUCKET}.s3.amazonaws.com/{s3_key}")
-    return image_urls
-
-def update_listing(listing_id, body, listing_table, image_urls):
+        keys.append(key)
+        keys.extend(f"variants/{key}/{name}.{extension}" for name, extension in IMAGE_VARIANT_EXTENSIONS.items())
+    failed_keys = []
+    for start in range(0, len(keys), DELETE_BATCH_SIZE):
+        batch = keys[start:start + DELETE_BATCH_SIZE]
+        response = s3.delete_objects(
+            Bucket=S3_BUCKET,
+            Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+        )
+        for error in response.get('Errors', []):
+            logger.error(f"Failed to delete image {error['Key']}: {error['Code']} {error['Message']}")
+            failed_keys.append(error['Key'])
+        logger.info(f"Deleted {len(batch) - len(response.get('Errors', []))} of {len(batch)} images")
+    return failed_keys
+
+def update_listing(listing_id, body, listing_table, image_urls, variants=None):
     expression_attribute_names = {"#name": "name", "#desc": "description", "#images": "images"}
     expression_attribute_values = {
         ":name": body.get("name"),
@@ -87,6 +102,10 @@ def update_listing(listing_id, body, listing_table, image_urls):
         ":images": image_urls
     }
     update_expression = "SET #name = :name, #desc = :desc, #images = :images"
+    if variants is not None:
+        expression_attribute_names["#variants"] = "imageVariants"
+        expression_attribute_values[":variants"] = variants
+        update_expression += ", #variants = :variants"
     listing_table.update_item(
         Key={'listingID': listing_id},
         UpdateExpression=update_expression,
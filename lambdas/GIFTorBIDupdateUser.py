@@ -2,9 +2,11 @@ import json
 import boto3
 import uuid
 import base64
+from botocore.exceptions import ClientError
 from datetime import datetime, timedelta
 import logging
 import os
+from giftorbid_common.locations import location_key
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -12,6 +14,7 @@ logger.setLevel(logging.INFO)
 dynamodb = boto3.resource('dynamodb')
 
 DYNAMODB_USER_TABLE = os.environ['DYNAMODB_USER_TABLE']
+DYNAMODB_LISTING_TABLE = os.environ['DYNAMODB_LISTING_TABLE']
 
 def lambda_handler(event, context):
     try:
@@ -56,10 +59,14 @@ def lambda_handler(event, context):
                 ':a': address,
                 ':pc': postal_code
             },
-            ReturnValues="UPDATED_NEW"
+            ReturnValues="ALL_OLD"
         )
         
-        logger.info("User updated successfully: %s", update_response)
+        logger.info("User updated successfully: %s", user_email)
+
+        old_user = update_response.get('Attributes', {})
+        if (old_user.get('country'), old_user.get('county'), old_user.get('city')) != (country, county, city):
+            update_listing_locations(old_user.get('listingsIDs', set()), country, county, city)
 
         return {"statusCode": 200, "body": json.dumps({"message": "User update successfully"})}
 
@@ -67,3 +74,37 @@ def lambda_handler(event, context):
         logger.error("Error: %s", str(e))
         return {"statusCode": 500, "body": json.dumps({"error": str(e)})}
 
+
+def update_listing_locations(listing_ids, country, county, city):
+    """Copy the seller's new location onto their listings that are still up for grabs."""
+    listing_table = dynamodb.Table(DYNAMODB_LISTING_TABLE)
+    updated = 0
+    for listing_id in listing_ids:
+        listing_type = listing_id.split('-', 1)[0]
+        if country:
+            update_expression = "SET country = :c, county = :co, city = :ci, locationPartition = :lp, locationSort = :ls"
+            expression_values = {
+                ':c': country,
+                ':co': county or '',
+                ':ci': city or '',
+                ':lp': f"{listing_type}#{location_key(country)}",
+                ':ls': f"{location_key(county or '')}#{location_key(city or '')}#"
+            }
+        else:
+            update_expression = "REMOVE country, county, city, locationPartition, locationSort"
+            expression_values = {}
+        expression_values.update({':available': 'available', ':redeemed': 'redeemed'})
+
+        try:
+            listing_table.update_item(
+                Key={'listingID': listing_id},
+                UpdateExpression=update_expression,
+                ConditionExpression="attribute_exists(listingID) AND #status IN (:available, :redeemed)",
+                ExpressionAttributeNames={"#status": "status"},
+                ExpressionAttributeValues=expression_values
+            )
+            updated += 1
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+    logger.info("Moved %d of %d listings to the new location", updated, len(listing_ids))
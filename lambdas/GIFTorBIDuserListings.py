@@ -3,6 +3,7 @@ import boto3
 import logging
 from decimal import Decimal
 import os
+from giftorbid_common.compression import compress_response
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
@@ -11,6 +12,8 @@ dynamodb = boto3.resource('dynamodb')
 
 DYNAMODB_LISTING_TABLE = os.environ['DYNAMODB_LISTING_TABLE']
 
+IMAGE_SIZES = ['thumbnail', 'card', 'full', 'original']
+
 def lambda_handler(event, context):
     try:
 
@@ -24,22 +27,25 @@ def lambda_handler(event, context):
         logger.info("Received email: %s", user_email)
         path = event.get('resource', '')
         logger.info("Received path: %s", path)
+        image_size = params.get("imageSize", "thumbnail")
+        if image_size not in IMAGE_SIZES:
+            return {"statusCode": 400, "body": json.dumps({"error": f"Invalid imageSize: {image_size}"})}
         
         table = dynamodb.Table(DYNAMODB_LISTING_TABLE)
 
         if path == "/user/listings":
-            listings = query_listings_by_email(table, user_email, 'sellerEmail')
-            return {
+            listings = apply_image_size(query_listings_by_email(table, user_email, 'sellerEmail'), image_size)
+            return compress_response({
                 "statusCode": 200,
-                "body": json.dumps(listings, default=str)
-            }
+                "body": listings
+            }, event)
 
         elif path == "/user/redeems":
-            redeems = query_listings_by_email(table, user_email, 'redeemerEmail')
-            return {
+            redeems = apply_image_size(query_listings_by_email(table, user_email, 'redeemerEmail'), image_size)
+            return compress_response({
                 "statusCode": 200,
-                "body": json.dumps(redeems, default=str)
-            }
+                "body": redeems
+            }, event)
 
         else:
             return {"statusCode": 404, "body": json.dumps({"error": "Resource not found"})}
@@ -56,3 +62,14 @@ def query_listings_by_email(table, email, email_field):
         FilterExpression=Attr(email_field).eq(email)
     )
     return response['Items']
+
+def apply_image_size(listings, image_size):
+    """Replace listing images with the requested resized variant, keeping the original where none has been generated."""
+    if image_size == 'original':
+        return listings
+    for listing in listings:
+        variants = listing.pop('imageVariants', None)
+        # Listings written before variants were keyed by image URL hold a list; serve their originals.
+        if isinstance(variants, dict):
+            listing['images'] = [variants.get(url, {}).get(image_size, url) for url in listing.get('images', [])]
+    return listings
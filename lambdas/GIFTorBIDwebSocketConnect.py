@@ -1,16 +1,29 @@
 import json
 import boto3
 import os
+import time
+from giftorbid_common.auth import authorized_email
 
 
 dynamodb = boto3.resource('dynamodb')
 
 DYNAMODB_CONNECTION_TABLE = os.environ['DYNAMODB_CONNECTION_TABLE']
 
+# API Gateway closes WebSocket connections after two hours; TTL cleans up any missed disconnects.
+CONNECTION_TTL_SECONDS = 2 * 60 * 60 + 300
+
 def lambda_handler(event, context):
     connectionId = event['requestContext']['connectionId']
 
+    item = {
+        'connectionID': connectionId,
+        'expiresAt': int(time.time()) + CONNECTION_TTL_SECONDS
+    }
+    user_email = authorized_email(event['requestContext'].get('authorizer') or {})
+    if user_email:
+        item['userEmail'] = user_email
+
     connections_table = dynamodb.Table(DYNAMODB_CONNECTION_TABLE)
-    connections_table.put_item(Item={'connectionID': connectionId})
+    connections_table.put_item(Item=item)
 
-    return {}
\ No newline at end of file
+    return {}
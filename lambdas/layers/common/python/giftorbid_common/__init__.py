@@ -0,0 +1 @@
+"""Helpers shared by the GIFTorBID Lambdas, deployed as the giftorbid-common layer."""
@@ -0,0 +1,18 @@
+import json
+
+def authorized_claims(authorizer):
+    claims = authorizer.get('claims') or {}
+    if isinstance(claims, str):
+        claims = json.loads(claims)
+    return claims
+
+def authorized_email(authorizer):
+    """Email of the authenticated user from a Lambda authorizer context or Cognito claims."""
+    return authorizer.get('userEmail') or authorizer.get('email') or authorized_claims(authorizer).get('email')
+
+def authorized_groups(authorizer):
+    """Cognito groups of the authenticated user; API Gateway passes them as a list or a comma-separated string."""
+    groups = authorized_claims(authorizer).get('cognito:groups') or authorizer.get('groups') or []
+    if isinstance(groups, str):
+        groups = groups.strip('[]').replace(',', ' ').split()
+    return set(groups)
@@ -0,0 +1,93 @@
+import base64
+import zlib
+from giftorbid_common.serialization import iter_json
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Below this many bytes compression saves less than it costs (roughly one TCP packet).
+MIN_COMPRESS_BYTES = 1400
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+def compress_response(response, event):
+    """Compress a response body with the best encoding the client accepts, when it is large enough to pay off.
+
+    A body that is not a string is JSON-encoded here, list items a chunk at a
+    time straight into the compressor, so large feeds are never held as one
+    uncompressed string.
+    """
+    body = response.get('body')
+    pieces = iter([body.encode()]) if isinstance(body, str) else iter_json(body)
+    head = []
+    head_size = 0
+    for piece in pieces:
+        head.append(piece)
+        head_size += len(piece)
+        if head_size >= MIN_COMPRESS_BYTES:
+            break
+
+    headers = {name.lower(): value for name, value in (event.get('headers') or {}).items()}
+    accepted = accepted_encodings(headers.get('accept-encoding', ''))
+    if head_size < MIN_COMPRESS_BYTES:
+        compressor = None
+    elif brotli and accepted.get('br', 0) > 0 and accepted['br'] >= accepted.get('gzip', 0):
+        encoding, compressor = 'br', brotli.Compressor(quality=BROTLI_QUALITY)
+    elif accepted.get('gzip', 0) > 0:
+        # wbits=31 writes the gzip container, as gzip.compress does.
+        encoding, compressor = 'gzip', zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+    else:
+        compressor = None
+        response.setdefault('headers', {})['Vary'] = 'Accept-Encoding'
+
+    if compressor is None:
+        if not isinstance(body, str):
+            response['body'] = b''.join([*head, *pieces]).decode()
+            response['headers'] = {**response.get('headers', {}), 'Content-Type': 'application/json'}
+        return response
+
+    compressed = [compressor.process(piece) if encoding == 'br' else compressor.compress(piece) for piece in head]
+    compressed.extend(compressor.process(piece) if encoding == 'br' else compressor.compress(piece) for piece in pieces)
+    compressed.append(compressor.finish() if encoding == 'br' else compressor.flush())
+
+    response['headers'] = {
+        **response.get('headers', {}),
+        'Content-Type': 'application/json',
+        'Content-Encoding': encoding,
+        'Vary': 'Accept-Encoding'
+    }
+    response['body'] = base64.b64encode(b''.join(compressed)).decode()
+    response['isBase64Encoded'] = True
+    return response
+
+def accepted_encodings(header):
+    """Parse Accept-Encoding into {encoding: q} for the encodings we can produce.
+
+    "*" only stands for encodings the header does not name, so an explicit
+    "gzip;q=0" still refuses gzip.
+    """
+    listed = {}
+    for part in header.split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        listed['gzip' if name == 'x-gzip' else name] = q
+
+    accepted = {}
+    for encoding in ('br', 'gzip'):
+        if encoding in listed:
+            accepted[encoding] = listed[encoding]
+        elif '*' in listed:
+            accepted[encoding] = listed['*']
+    return accepted
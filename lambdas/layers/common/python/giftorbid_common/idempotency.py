@@ -0,0 +1,111 @@
+import json
+import boto3
+from botocore.exceptions import ClientError
+import hashlib
+import os
+import time
+
+dynamodb = boto3.resource('dynamodb')
+
+# Replays of an Idempotency-Key are answered from the stored response for a day.
+IDEMPOTENCY_TTL_SECONDS = 24 * 60 * 60
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+def handle_idempotent(scope, event, context, handle_request, admit=None):
+    """Run handle_request at most once per Idempotency-Key header within scope.
+
+    Requests without the header run as usual. admit(event) may return a
+    rejection response to shed the request before it runs; it is consulted
+    after a stored response would be replayed, and a rejected request
+    releases its key so it can be retried.
+    """
+    idempotency_key = get_idempotency_key(event)
+    if idempotency_key is None:
+        return (admit and admit(event)) or handle_request(event, context)
+    if len(idempotency_key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+        return {"statusCode": 400, "body": json.dumps({"error": "Idempotency-Key is too long"})}
+
+    record_key = f"{scope}#{idempotency_key}"
+    fingerprint = hashlib.sha256((event.get('body') or '').encode()).hexdigest()
+    replay = start_idempotent_request(record_key, fingerprint, context)
+    if replay is not None:
+        return replay
+
+    rejection = admit and admit(event)
+    if rejection:
+        release_idempotent_request(record_key)
+        return rejection
+
+    response = handle_request(event, context)
+    finish_idempotent_request(record_key, response)
+    return response
+
+def get_idempotency_key(event):
+    for name, value in (event.get('headers') or {}).items():
+        if name.lower() == 'idempotency-key' and value:
+            return value.strip()
+    return None
+
+def idempotency_table():
+    return dynamodb.Table(os.environ['DYNAMODB_IDEMPOTENCY_TABLE'])
+
+def start_idempotent_request(record_key, fingerprint, context):
+    """Claim the idempotency record, or return the response a retry should get instead of running again."""
+    table = idempotency_table()
+    now = int(time.time())
+
+    record = table.get_item(Key={'idempotencyKey': record_key}, ConsistentRead=True).get('Item')
+    if record and int(record.get('expiresAt', 0)) > now:
+        return idempotent_replay(record, fingerprint, now)
+
+    # The lock outlives this invocation, so a crashed attempt can be retried once it expires.
+    lock_expires_at = now + context.get_remaining_time_in_millis() // 1000 + 1
+    try:
+        table.put_item(
+            Item={
+                'idempotencyKey': record_key,
+                'fingerprint': fingerprint,
+                'status': 'IN_PROGRESS',
+                'lockExpiresAt': lock_expires_at,
+                'expiresAt': now + IDEMPOTENCY_TTL_SECONDS
+            },
+            ConditionExpression="attribute_not_exists(idempotencyKey) OR expiresAt < :now OR (#status = :in_progress AND lockExpiresAt < :now)",
+            ExpressionAttributeNames={"#status": "status"},
+            ExpressionAttributeValues={":now": now, ":in_progress": 'IN_PROGRESS'}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        record = table.get_item(Key={'idempotencyKey': record_key}, ConsistentRead=True).get('Item', {})
+        return idempotent_replay(record, fingerprint, now)
+    return None
+
+def idempotent_replay(record, fingerprint, now):
+    if record.get('fingerprint') != fingerprint:
+        return {"statusCode": 422, "body": json.dumps({"error": "Idempotency-Key was already used for a different request"})}
+    if record.get('status') == 'COMPLETED':
+        response = json.loads(record['response'])
+        response['headers'] = {**response.get('headers', {}), 'Idempotent-Replayed': 'true'}
+        return response
+    retry_after = max(int(record.get('lockExpiresAt', now)) - now, 1)
+    return {
+        "statusCode": 409,
+        "headers": {"Retry-After": str(retry_after)},
+        "body": json.dumps({"error": "A request with this Idempotency-Key is still in progress"})
+    }
+
+def release_idempotent_request(record_key):
+    idempotency_table().delete_item(Key={'idempotencyKey': record_key})
+
+def finish_idempotent_request(record_key, response):
+    """Store the final response for replays; server errors and rate limits release the key so the client can retry."""
+    status_code = response.get('statusCode', 500)
+    if status_code >= 500 or status_code == 429:
+        release_idempotent_request(record_key)
+        return
+    idempotency_table().update_item(
+        Key={'idempotencyKey': record_key},
+        UpdateExpression="SET #status = :completed, #response = :response REMOVE lockExpiresAt",
+        ExpressionAttributeNames={"#status": "status", "#response": "response"},
+        ExpressionAttributeValues={":completed": 'COMPLETED', ":response": json.dumps(response)}
+    )
@@ -0,0 +1,170 @@
+import base64
+import boto3
+from botocore.exceptions import ClientError
+import hashlib
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+
+logger = logging.getLogger()
+
+s3 = boto3.client('s3')
+
+MAX_IMAGE_SIZE = 10 * 1024 * 1024
+ALLOWED_CONTENT_TYPES = ['image/jpeg', 'image/png', 'image/webp']
+MAX_S3_WORKERS = 8
+# 8 MiB of base64 text decodes to 6 MiB, above the 5 MiB minimum size of a multipart upload part.
+BASE64_CHUNK_SIZE = 8 * 1024 * 1024
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+IMAGE_VARIANT_EXTENSIONS = {'thumbnail': 'webp', 'card': 'webp', 'full': 'jpg'}
+
+def bucket_url():
+    return f"https://{os.environ['S3_BUCKET']}.s3.amazonaws.com/"
+
+def image_folder(listing_type):
+    return "donations" if listing_type.lower() == "donation" else "auctions"
+
+def verify_uploaded_images(images, object_id, listing_type, current_images=()):
+    """Check that referenced images are either kept from the listing or uploaded for it through an upload session."""
+    folder = image_folder(listing_type)
+    with ThreadPoolExecutor(max_workers=MAX_S3_WORKERS) as executor:
+        errors = executor.map(lambda image: verify_uploaded_image(image, folder, object_id, current_images), images)
+        return next((error for error in errors if error), None)
+
+def verify_uploaded_image(image, folder, object_id, current_images):
+    if image.startswith("data:") or image in current_images:
+        return None
+    if not image.startswith(f"{folder}/{object_id}/"):
+        return f"Image {image} was not uploaded for this listing"
+    try:
+        head = s3.head_object(Bucket=os.environ['S3_BUCKET'], Key=image)
+    except ClientError:
+        return f"Image {image} was not uploaded"
+    if head['ContentLength'] > MAX_IMAGE_SIZE or head.get('ContentType') not in ALLOWED_CONTENT_TYPES:
+        return f"Image {image} is not a valid image upload"
+    return None
+
+def store_images(images, object_id, listing_type, current_images=()):
+    """Store the listing images concurrently and return their URLs in the original order."""
+    folder = image_folder(listing_type)
+    with ThreadPoolExecutor(max_workers=MAX_S3_WORKERS) as executor:
+        return list(executor.map(
+            lambda image: store_image(image, folder, object_id, current_images),
+            images
+        ))
+
+def store_image(image, folder, object_id, current_images=()):
+    """Store a base64 image under a key derived from its content, skipping images the listing already has."""
+    if image.startswith("https://"):
+        return image
+    if not image.startswith("data:"):
+        return bucket_url() + image
+    digest = hashlib.sha256()
+    header = b''
+    for chunk in iter_image_chunks(image):
+        header = header or chunk[:16]
+        digest.update(chunk)
+    content_type, extension = detect_image_type(header)
+    s3_key = f"{folder}/{object_id}/{digest.hexdigest()}.{extension}"
+    image_url = bucket_url() + s3_key
+    if image_url in current_images:
+        logger.info(f"Image unchanged, skipping upload: {s3_key}")
+        return image_url
+    upload_image_chunks(image, s3_key, content_type)
+    return image_url
+
+def iter_image_chunks(image):
+    """Decode a base64 data URL chunk by chunk, so only one decoded chunk is held at a time."""
+    start = image.index(",") + 1
+    for offset in range(start, len(image), BASE64_CHUNK_SIZE):
+        yield base64.b64decode(image[offset:offset + BASE64_CHUNK_SIZE])
+
+def upload_image_chunks(image, s3_key, content_type):
+    """Upload a base64 data URL, streaming it as multipart upload parts when it spans several chunks."""
+    bucket = os.environ['S3_BUCKET']
+    chunks = iter_image_chunks(image)
+    first_chunk = next(chunks, b'')
+    second_chunk = next(chunks, None)
+    if second_chunk is None:
+        s3.put_object(Bucket=bucket, Key=s3_key, Body=first_chunk, ContentType=content_type, CacheControl=IMMUTABLE_CACHE_CONTROL)
+        return
+
+    upload_id = s3.create_multipart_upload(
+        Bucket=bucket, Key=s3_key, ContentType=content_type, CacheControl=IMMUTABLE_CACHE_CONTROL
+    )['UploadId']
+    try:
+        parts = []
+        for part_number, chunk in enumerate(itertools.chain([first_chunk, second_chunk], chunks), start=1):
+            response = s3.upload_part(Bucket=bucket, Key=s3_key, UploadId=upload_id, PartNumber=part_number, Body=chunk)
+            parts.append({'ETag': response['ETag'], 'PartNumber': part_number})
+        s3.complete_multipart_upload(Bucket=bucket, Key=s3_key, UploadId=upload_id, MultipartUpload={'Parts': parts})
+        logger.info(f"Uploaded {s3_key} in {len(parts)} parts")
+    except Exception:
+        s3.abort_multipart_upload(Bucket=bucket, Key=s3_key, UploadId=upload_id)
+        raise
+
+def detect_image_type(image_data):
+    """Detect the image format from its leading bytes, defaulting to JPEG."""
+    if image_data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return "image/png", "png"
+    if image_data[:4] == b'RIFF' and image_data[8:12] == b'WEBP':
+        return "image/webp", "webp"
+    return "image/jpeg", "jpg"
+
+def generated_variants(image_urls, known_variants=None):
+    """Map each image URL to its resized variant URLs, for the images GIFTorBIDprocessImage has finished.
+
+    Entries already in known_variants are reused; the rest are checked in S3.
+    """
+    known_variants = known_variants if isinstance(known_variants, dict) else {}
+    pending = [url for url in image_urls if url not in known_variants]
+    with ThreadPoolExecutor(max_workers=MAX_S3_WORKERS) as executor:
+        found = dict(zip(pending, executor.map(variant_urls_if_generated, pending)))
+
+    variants = {}
+    for url in image_urls:
+        urls = known_variants.get(url) or found.get(url)
+        if urls:
+            variants[url] = urls
+    return variants
+
+def variant_urls_if_generated(url):
+    key = url.split(bucket_url())[-1]
+    # GIFTorBIDprocessImage stores "full" last, so once it exists every variant does.
+    try:
+        s3.head_object(Bucket=os.environ['S3_BUCKET'], Key=f"variants/{key}/full.{IMAGE_VARIANT_EXTENSIONS['full']}")
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey', 'NotFound'):
+            return None
+        raise
+    return {
+        name: f"{bucket_url()}variants/{key}/{name}.{extension}"
+        for name, extension in IMAGE_VARIANT_EXTENSIONS.items()
+    }
+
+def record_late_variants(listing_table, listing_id, image_urls, variants):
+    """Record variants that finished while the listing was being written.
+
+    GIFTorBIDprocessImage only records variants of images the listing already
+    shows, so one finishing between generated_variants and the listing write
+    would otherwise never be recorded. Checking again after the write closes
+    that window: anything finishing later records itself.
+    """
+    missing = [url for url in image_urls if url not in variants]
+    late = generated_variants(missing) if missing else {}
+    for url, urls in late.items():
+        try:
+            listing_table.update_item(
+                Key={'listingID': listing_id},
+                UpdateExpression="SET imageVariants.#url = :variants",
+                ConditionExpression="contains(images, :url) AND attribute_type(imageVariants, :map)",
+                ExpressionAttributeNames={'#url': url},
+                ExpressionAttributeValues={':variants': urls, ':url': url, ':map': 'M'}
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            logger.info("Listing %s no longer shows %s, not recording its variants", listing_id, url)
+    if late:
+        logger.info("Recorded %d late image variants on listing %s", len(late), listing_id)
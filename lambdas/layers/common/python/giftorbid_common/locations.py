@@ -0,0 +1,7 @@
+import unicodedata
+
+def location_key(value):
+    """Normalize a place name for index keys: lowercase, no diacritics, dashes for spaces."""
+    folded = unicodedata.normalize('NFKD', value.strip().lower())
+    folded = ''.join(char for char in folded if not unicodedata.combining(char))
+    return '-'.join(folded.replace('#', ' ').split())
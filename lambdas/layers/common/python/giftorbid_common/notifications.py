@@ -0,0 +1,33 @@
+import json
+import boto3
+import logging
+import os
+import time
+
+logger = logging.getLogger()
+
+sqs = boto3.client('sqs')
+
+SQS_BATCH_SIZE = 10
+SQS_SEND_ATTEMPTS = 3
+
+def enqueue_notifications(notifications):
+    """Queue (userEmail, notification) pairs for GIFTorBIDnotificationWriter instead of writing user items inline."""
+    queue_url = os.environ['NOTIFICATIONS_QUEUE_URL']
+    entries = [{
+        'Id': str(index),
+        'MessageBody': json.dumps({'userEmail': user_email, 'notification': notification}, default=str)
+    } for index, (user_email, notification) in enumerate(notifications)]
+
+    for start in range(0, len(entries), SQS_BATCH_SIZE):
+        batch = entries[start:start + SQS_BATCH_SIZE]
+        for attempt in range(SQS_SEND_ATTEMPTS):
+            if attempt:
+                time.sleep(0.1 * 2 ** attempt)
+            response = sqs.send_message_batch(QueueUrl=queue_url, Entries=batch)
+            failed_ids = {failure['Id'] for failure in response.get('Failed', [])}
+            batch = [entry for entry in batch if entry['Id'] in failed_ids]
+            if not batch:
+                break
+        if batch:
+            logger.error("Could not queue %d notifications: %s", len(batch), [entry['MessageBody'] for entry in batch])
@@ -0,0 +1,24 @@
+import base64
+import json
+
+def encode_cursor(last_evaluated_key):
+    """Turn a LastEvaluatedKey into an opaque cursor for the next page."""
+    if not last_evaluated_key:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(last_evaluated_key).encode()).decode()
+
+def decode_cursor(cursor, key_attributes, expected):
+    """Turn a cursor from encode_cursor back into an ExclusiveStartKey.
+
+    The key must have exactly key_attributes and match every value in
+    expected, so a cursor cannot page through another user's or index's items.
+    """
+    if not cursor:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(key, dict) or set(key) != set(key_attributes) or any(key[name] != value for name, value in expected.items()):
+        raise ValueError("Invalid cursor")
+    return key
@@ -0,0 +1,78 @@
+import json
+from decimal import Decimal
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Larger integers lose precision in JavaScript clients and are sent as strings.
+MAX_SAFE_INTEGER = 2 ** 53
+# Items encoded per call when a list is streamed.
+STREAM_CHUNK_ITEMS = 100
+# Feeds repeat the same amounts, durations and ratings, so converted Decimals are memoised.
+MAX_CACHED_DECIMALS = 16384
+
+decimal_cache = {}
+
+def to_json(value):
+    """Serialize a response body, writing DynamoDB Decimals as JSON numbers and sets as sorted lists."""
+    if orjson:
+        return orjson.dumps(value, default=json_default).decode()
+    return json.dumps(value, default=json_default, separators=(',', ':'))
+
+def to_json_bytes(value):
+    """Like to_json, but UTF-8 bytes; with orjson this skips the decode copy."""
+    if orjson:
+        return orjson.dumps(value, default=json_default)
+    return json.dumps(value, default=json_default, separators=(',', ':')).encode()
+
+def iter_json(value):
+    """Encode value as UTF-8 JSON in pieces, STREAM_CHUNK_ITEMS list items at a time.
+
+    Lists at the top level or directly under a top-level dict are streamed,
+    so a large feed never exists as one uncompressed string.
+    """
+    if isinstance(value, dict):
+        yield b'{'
+        for index, (key, item) in enumerate(value.items()):
+            yield (b',' if index else b'') + to_json_bytes(str(key)) + b':'
+            yield from iter_json_list(item) if isinstance(item, list) else [to_json_bytes(item)]
+        yield b'}'
+    elif isinstance(value, list):
+        yield from iter_json_list(value)
+    else:
+        yield to_json_bytes(value)
+
+def iter_json_list(items):
+    yield b'['
+    for start in range(0, len(items), STREAM_CHUNK_ITEMS):
+        chunk = to_json_bytes(items[start:start + STREAM_CHUNK_ITEMS])
+        if len(chunk) > 2:
+            yield (b',' if start else b'') + chunk[1:-1]
+    yield b']'
+
+def json_default(value):
+    # Cache hits come first: they are the common case and the hook runs once per Decimal.
+    try:
+        return decimal_cache[value]
+    except (KeyError, TypeError):
+        pass
+    if value.__class__ is Decimal:
+        if len(decimal_cache) >= MAX_CACHED_DECIMALS:
+            decimal_cache.clear()
+        converted = decimal_cache[value] = convert_decimal(value)
+        return converted
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    return str(value)
+
+def convert_decimal(value):
+    integer = int(value)
+    if integer == value and -MAX_SAFE_INTEGER <= integer <= MAX_SAFE_INTEGER:
+        return integer
+    # Only emit a float when it reads back as the same number; otherwise keep the exact digits.
+    as_float = float(value)
+    if Decimal(repr(as_float)) == value:
+        return as_float
+    return str(value)
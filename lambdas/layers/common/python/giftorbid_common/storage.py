@@ -0,0 +1,21 @@
+import boto3
+import time
+
+dynamodb = boto3.resource('dynamodb')
+
+def batch_get_items(request_items):
+    """Read items from several tables with a single BatchGetItem, retrying unprocessed keys.
+
+    Returns a dict mapping each table name to the list of items found in it.
+    """
+    items = {table_name: [] for table_name in request_items}
+    attempt = 0
+    while request_items:
+        if attempt:
+            time.sleep(min(0.05 * 2 ** attempt, 1))
+        response = dynamodb.batch_get_item(RequestItems=request_items)
+        for table_name, table_items in response['Responses'].items():
+            items[table_name].extend(table_items)
+        request_items = response.get('UnprocessedKeys') or {}
+        attempt += 1
+    return items